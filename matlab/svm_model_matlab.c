@@ -250,7 +250,12 @@ struct svm_model *matlab_matrix_to_model(const mxArray *matlab_struct, const cha
 	model->label = NULL;
 	model->sv_indices = NULL;
 	model->nSV = NULL;
+	model->w = NULL;
+	model->w_dim = 0;
+	model->sv_square = NULL;
+	model->inverted_index = NULL;
 	model->free_sv = 1; // XXX
+	model->image_size = 0;
 
 	ptr = mxGetPr(rhs[id]);
 	model->param.svm_type = (int)ptr[0];
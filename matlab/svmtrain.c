@@ -42,12 +42,13 @@ void exit_with_help()
 	"-c cost : set the parameter C of C-SVC, epsilon-SVR, and nu-SVR (default 1)\n"
 	"-n nu : set the parameter nu of nu-SVC, one-class SVM, and nu-SVR (default 0.5)\n"
 	"-p epsilon : set the epsilon in loss function of epsilon-SVR (default 0.1)\n"
-	"-m cachesize : set cache memory size in MB (default 100)\n"
+	"-m cachesize : set cache memory size in MB, or auto[:max_MB] (default 100)\n"
 	"-e epsilon : set tolerance of termination criterion (default 0.001)\n"
 	"-h shrinking : whether to use the shrinking heuristics, 0 or 1 (default 1)\n"
 	"-b probability_estimates : whether to train a SVC or SVR model for probability estimates, 0 or 1 (default 0)\n"
 	"-wi weight : set the parameter C of class i to weight*C, for C-SVC (default 1)\n"
 	"-v n: n-fold cross validation mode\n"
+	"-j nr_thread : set the number of threads for training (default 1)\n"
 	"-q : quiet mode (no outputs)\n"
 	);
 }
@@ -104,6 +105,28 @@ double do_cross_validation()
 	return retval;
 }
 
+// cachesize, auto, or auto:max_MB of option -m; return 0 if valid
+static int parse_cache_size(const char *s, struct svm_parameter *param)
+{
+	char *endptr;
+	if(strncmp(s,"auto",4) != 0)
+	{
+		param->auto_cache = 0;
+		param->cache_size = atof(s);
+		return 0;
+	}
+	param->auto_cache = 1;
+	param->cache_size = 0;
+	if(s[4] == '\0')
+		return 0;
+	if(s[4] != ':')
+		return 1;
+	param->cache_size = strtod(s+5,&endptr);
+	if(endptr == s+5 || *endptr != '\0' || !(param->cache_size > 0))
+		return 1;
+	return 0;
+}
+
 // nrhs should be 3
 int parse_command_line(int nrhs, const mxArray *prhs[], char *model_file_name)
 {
@@ -120,11 +143,13 @@ int parse_command_line(int nrhs, const mxArray *prhs[], char *model_file_name)
 	param.coef0 = 0;
 	param.nu = 0.5;
 	param.cache_size = 100;
+	param.auto_cache = 0;
 	param.C = 1;
 	param.eps = 1e-3;
 	param.p = 0.1;
 	param.shrinking = 1;
 	param.probability = 0;
+	param.nr_thread = 1;
 	param.nr_weight = 0;
 	param.weight_label = NULL;
 	param.weight = NULL;
@@ -170,7 +195,11 @@ int parse_command_line(int nrhs, const mxArray *prhs[], char *model_file_name)
 				param.nu = atof(argv[i]);
 				break;
 			case 'm':
-				param.cache_size = atof(argv[i]);
+				if(parse_cache_size(argv[i],&param) != 0)
+				{
+					mexPrintf("Wrong cache size %s\n",argv[i]);
+					return 1;
+				}
 				break;
 			case 'c':
 				param.C = atof(argv[i]);
@@ -187,6 +216,9 @@ int parse_command_line(int nrhs, const mxArray *prhs[], char *model_file_name)
 			case 'b':
 				param.probability = atoi(argv[i]);
 				break;
+			case 'j':
+				param.nr_thread = atoi(argv[i]);
+				break;
 			case 'q':
 				print_func = &print_null;
 				i--;
@@ -19,7 +19,8 @@ if sys.version_info[0] < 3:
 
 __all__ = ['libsvm', 'svm_problem', 'svm_parameter',
            'toPyModel', 'gen_svm_nodearray', 'print_null', 'svm_node', 'svm_forms',
-            'PRINT_STRING_FUN', 'kernel_names', 'c_double', 'svm_model']
+            'PRINT_STRING_FUN', 'kernel_names', 'c_double', 'svm_model', 'svm_kernel_cache',
+            'svm_solver_stats']
 
 try:
     dirname = path.dirname(path.abspath(__file__))
@@ -31,7 +32,7 @@ except:
         if sys.platform == 'win32':
             libsvm = CDLL(path.join(dirname, r'..\..\windows\libsvm.dll'))
         else:
-            libsvm = CDLL(path.join(dirname, '../../libsvm.so.4'))
+            libsvm = CDLL(path.join(dirname, '../../libsvm.so.5'))
     except:
     # For unix the prefix 'lib' is not considered.
         if find_library('svm'):
@@ -172,12 +173,19 @@ def csr_to_problem_nojit(l, x_val, x_ind, x_rowptr, prob_val, prob_ind, prob_row
         prob_ind[prob_slice] = x_ind[x_slice]+indx_start
         prob_val[prob_slice] = x_val[x_slice]
 
-def csr_to_problem(x, prob, isKernel):
+def new_x_space(size, x_space_file=None):
+    # Anonymous memory by default; a file-backed array lets the OS page
+    # instances in and out when x_space does not fit in memory.
+    if x_space_file == None or size == 0:
+        return np.empty(size, dtype=svm_node)
+    return np.memmap(x_space_file, dtype=svm_node, mode='w+', shape=(size,))
+
+def csr_to_problem(x, prob, isKernel, x_space_file=None):
     if not x.has_sorted_indices:
         x.sort_indices()
 
     # Extra space for termination node and (possibly) bias term
-    x_space = prob.x_space = np.empty((x.nnz+x.shape[0]), dtype=svm_node)
+    x_space = prob.x_space = new_x_space(x.nnz+x.shape[0], x_space_file)
     # rowptr has to be a 64bit integer because it will later be used for pointer arithmetic,
     # which overflows when the added pointer points to an address that is numerically high.
     prob.rowptr = x.indptr.astype(np.int64, copy=True)
@@ -194,12 +202,48 @@ def csr_to_problem(x, prob, isKernel):
     else:
         csr_to_problem_nojit(x.shape[0], x.data, x.indices, x.indptr, prob_val, prob_ind, prob.rowptr, indx_start)
 
+def dense_to_problem(x, prob, isKernel, x_space_file=None):
+    l, n = x.shape
+    if isKernel:
+        # every column is kept and index starts from 0 for precomputed kernel
+        prob.x_space = new_x_space(l*(n+1), x_space_file)
+        x_space = prob.x_space.reshape(l, n+1)
+        x_space["index"][:, :n] = np.arange(n)
+        x_space["value"][:, :n] = x
+        x_space["index"][:, n] = -1
+        prob.rowptr = np.arange(0, l*(n+1)+1, n+1, dtype=np.int64)
+        return n-1 if l > 0 and n > 0 else 0
+
+    # rowptr has to be a 64bit integer; see csr_to_problem
+    prob.rowptr = np.zeros(l+1, dtype=np.int64)
+    np.cumsum(np.count_nonzero(x, axis=1)+1, out=prob.rowptr[1:])
+    x_space = prob.x_space = new_x_space(prob.rowptr[-1], x_space_file)
+    prob_ind = x_space["index"]
+    prob_val = x_space["value"]
+    prob_ind[prob.rowptr[1:]-1] = -1
+
+    # Process blocks of rows to bound the size of temporary index arrays.
+    # Nonzeros are in row-major order, so the k-th nonzero of a block is
+    # shifted only by the termination nodes of the rows before it.
+    max_idx = 0
+    block = max(1, (1<<20)//max(n, 1))
+    for b in range(0, l, block):
+        xb = x[b:b+block]
+        rows, cols = xb.nonzero()
+        if len(cols) == 0:
+            continue
+        pos = prob.rowptr[b] + np.arange(len(rows)) + rows
+        prob_ind[pos] = cols + 1 # index starts from 1
+        prob_val[pos] = xb[rows, cols]
+        max_idx = max(max_idx, int(cols.max()) + 1)
+    return max_idx
+
 class svm_problem(Structure):
     _names = ["l", "y", "x"]
     _types = [c_int, POINTER(c_double), POINTER(POINTER(svm_node))]
     _fields_ = genFields(_names, _types)
 
-    def __init__(self, y, x, isKernel=False):
+    def __init__(self, y, x, isKernel=False, x_space_file=None):
         if (not isinstance(y, (list, tuple))) and (not (scipy and isinstance(y, np.ndarray))):
             raise TypeError("type of y: {0} is not supported!".format(type(y)))
 
@@ -216,13 +260,17 @@ class svm_problem(Structure):
                 pass
         else:
             raise TypeError("type of x: {0} is not supported!".format(type(x)))
+        if x_space_file != None and not (scipy != None and isinstance(x, (np.ndarray, sparse.spmatrix))):
+            raise TypeError("x_space_file requires x to be an ndarray or a scipy spmatrix")
         self.l = l = len(y)
 
         max_idx = 0
         x_space = self.x_space = []
         if scipy != None and isinstance(x, sparse.csr_matrix):
-            csr_to_problem(x, self, isKernel)
+            csr_to_problem(x, self, isKernel, x_space_file)
             max_idx = x.shape[1]
+        elif scipy != None and isinstance(x, np.ndarray) and x.ndim == 2:
+            max_idx = dense_to_problem(x, self, isKernel, x_space_file)
         else:
             for i, xi in enumerate(x):
                 tmp_xi, tmp_idx = gen_svm_nodearray(xi,isKernel=isKernel)
@@ -236,22 +284,34 @@ class svm_problem(Structure):
         else:
             for i, yi in enumerate(y): self.y[i] = yi
 
-        self.x = (POINTER(svm_node) * l)()
-        if scipy != None and isinstance(x, sparse.csr_matrix):
-            base = addressof(self.x_space.ctypes.data_as(POINTER(svm_node))[0])
-            x_ptr = cast(self.x, POINTER(c_uint64))
-            x_ptr = np.ctypeslib.as_array(x_ptr,(self.l,))
-            x_ptr[:] = self.rowptr[:-1]*sizeof(svm_node)+base
+        if scipy != None and (isinstance(x, sparse.csr_matrix) or (isinstance(x, np.ndarray) and x.ndim == 2)):
+            self.set_x_space(self.x_space, self.rowptr)
         else:
+            self.x = (POINTER(svm_node) * l)()
             for i, xi in enumerate(self.x_space): self.x[i] = xi
 
+    def set_x_space(self, x_space, rowptr):
+        """
+        Let x point to the instances stored in x_space, an ndarray of
+        svm_node. Instance i is x_space[rowptr[i]:rowptr[i+1]], ended by
+        a node with index -1. x_space is used without copying.
+        """
+        self.x_space, self.rowptr = x_space, rowptr
+        self.x = (POINTER(svm_node) * self.l)()
+        if self.l == 0:
+            return
+        base = x_space.ctypes.data
+        x_ptr = cast(self.x, POINTER(c_uint64))
+        x_ptr = np.ctypeslib.as_array(x_ptr,(self.l,))
+        x_ptr[:] = rowptr[:-1]*sizeof(svm_node)+base
+
 class svm_parameter(Structure):
     _names = ["svm_type", "kernel_type", "degree", "gamma", "coef0",
             "cache_size", "eps", "C", "nr_weight", "weight_label", "weight",
-            "nu", "p", "shrinking", "probability"]
+            "nu", "p", "shrinking", "probability", "nr_thread", "auto_cache"]
     _types = [c_int, c_int, c_int, c_double, c_double,
             c_double, c_double, c_double, c_int, POINTER(c_int), POINTER(c_double),
-            c_double, c_double, c_int, c_int]
+            c_double, c_double, c_int, c_int, c_int, c_int]
     _fields_ = genFields(_names, _types)
 
     def __init__(self, options = None):
@@ -282,6 +342,8 @@ class svm_parameter(Structure):
         self.p = 0.1
         self.shrinking = 1
         self.probability = 0
+        self.nr_thread = 1
+        self.auto_cache = 0
         self.nr_weight = 0
         self.weight_label = None
         self.weight = None
@@ -323,7 +385,18 @@ class svm_parameter(Structure):
                 self.nu = float(argv[i])
             elif argv[i] == "-m":
                 i = i + 1
-                self.cache_size = float(argv[i])
+                if argv[i] == "auto":
+                    self.auto_cache, self.cache_size = 1, 0
+                elif argv[i].startswith("auto:"):
+                    self.auto_cache = 1
+                    try:
+                        self.cache_size = float(argv[i][5:])
+                    except ValueError:
+                        self.cache_size = 0
+                    if not self.cache_size > 0:
+                        raise ValueError("Wrong cache size " + argv[i])
+                else:
+                    self.auto_cache, self.cache_size = 0, float(argv[i])
             elif argv[i] == "-c":
                 i = i + 1
                 self.C = float(argv[i])
@@ -339,6 +412,9 @@ class svm_parameter(Structure):
             elif argv[i] == "-b":
                 i = i + 1
                 self.probability = int(argv[i])
+            elif argv[i] == "-j":
+                i = i + 1
+                self.nr_thread = int(argv[i])
             elif argv[i] == "-q":
                 self.print_func = ctypes_print_null
             elif argv[i] == "-v":
@@ -363,14 +439,54 @@ class svm_parameter(Structure):
             self.weight[i] = weight[i]
             self.weight_label[i] = weight_label[i]
 
+class svm_kernel_cache(object):
+    """
+    svm_kernel_cache(prob, options) -> kernel cache
+    svm_kernel_cache(prob, param) -> kernel cache
+
+    Kernel values of prob that are kept across calls of svm_train
+    with kernel_cache=this object. They are used only by trainings
+    with the same kernel parameters (-t, -d, -g, -r) on prob or on a
+    subset of its instances. The cache size is given by -m.
+    """
+    def __init__(self, prob, param=None):
+        if not isinstance(param, svm_parameter):
+            param = svm_parameter(param)
+        if param.gamma == 0 and prob.n > 0:
+            param.gamma = 1.0 / prob.n
+        # the cache finds instances by their addresses in prob
+        self.prob = prob
+        self.cache = c_void_p(libsvm.svm_create_kernel_cache(prob, param))
+
+    def __del__(self):
+        if getattr(self, 'cache', None):
+            libsvm.svm_free_and_destroy_kernel_cache(byref(self.cache))
+
+class svm_solver_stats(Structure):
+    """
+    Statistics of the solver for one sub-problem (see svm_solver_stats
+    in svm.h): iter, time (in seconds), nr_kernel_eval, nr_cache_hit,
+    nr_cache_miss, nr_shrink, nr_reconstruct, and active_size.
+    """
+    _names = ['iter', 'time', 'nr_kernel_eval', 'nr_cache_hit', 'nr_cache_miss',
+            'nr_shrink', 'nr_reconstruct', 'active_size']
+    _types = [c_int, c_double, c_longlong, c_longlong, c_longlong,
+            c_int, c_int, c_int]
+    _fields_ = genFields(_names, _types)
+
+    def __str__(self):
+        return ', '.join('%s = %s' % (name, getattr(self, name)) for name in self._names)
+
 class svm_model(Structure):
     _names = ['param', 'nr_class', 'l', 'SV', 'sv_coef', 'rho',
             'probA', 'probB', 'prob_density_marks', 'sv_indices',
-            'label', 'nSV', 'free_sv']
+            'label', 'nSV', 'free_sv', 'image_size', 'w', 'w_dim',
+            'sv_square', 'inverted_index']
     _types = [svm_parameter, c_int, c_int, POINTER(POINTER(svm_node)),
             POINTER(POINTER(c_double)), POINTER(c_double),
             POINTER(c_double), POINTER(c_double), POINTER(c_double),
-            POINTER(c_int), POINTER(c_int), POINTER(c_int), c_int]
+            POINTER(c_int), POINTER(c_int), POINTER(c_int), c_int, c_size_t,
+            POINTER(c_double), c_int, POINTER(c_double), c_void_p]
     _fields_ = genFields(_names, _types)
 
     def __init__(self):
@@ -381,6 +497,13 @@ class svm_model(Structure):
         if hasattr(self, '__createfrom__') and self.__createfrom__ == 'C':
             libsvm.svm_free_and_destroy_model(pointer(pointer(self)))
 
+    def __reduce__(self):
+        # pickle the binary model format; see svm_save_model_buffer
+        size = libsvm.svm_save_model_buffer(self, None, 0)
+        buf = create_string_buffer(size)
+        libsvm.svm_save_model_buffer(self, buf, size)
+        return (model_from_buffer, (buf.raw,))
+
     def get_svm_type(self):
         return libsvm.svm_get_svm_type(self)
 
@@ -390,14 +513,22 @@ class svm_model(Structure):
     def get_svr_probability(self):
         return libsvm.svm_get_svr_probability(self)
 
-    def get_labels(self):
+    def get_labels(self, return_scipy=False):
         nr_class = self.get_nr_class()
+        if scipy != None and return_scipy:
+            if not self.label: # regression and one-class SVM
+                return np.zeros(nr_class, dtype=np.int32)
+            return self._as_ndarray(self.label, nr_class, np.int32).copy()
         labels = (c_int * nr_class)()
         libsvm.svm_get_labels(self, labels)
         return labels[:nr_class]
 
-    def get_sv_indices(self):
+    def get_sv_indices(self, return_scipy=False):
         total_sv = self.get_nr_sv()
+        if scipy != None and return_scipy:
+            if not self.sv_indices: # not available in a loaded model
+                return np.zeros(total_sv, dtype=np.int32)
+            return self._as_ndarray(self.sv_indices, total_sv, np.int32).copy()
         sv_indices = (c_int * total_sv)()
         libsvm.svm_get_sv_indices(self, sv_indices)
         return sv_indices[:total_sv]
@@ -405,14 +536,129 @@ class svm_model(Structure):
     def get_nr_sv(self):
         return libsvm.svm_get_nr_sv(self)
 
+    def get_nSV(self, return_scipy=False):
+        nr_class = self.get_nr_class()
+        if scipy != None and return_scipy:
+            if not self.nSV: # regression and one-class SVM
+                return np.zeros(nr_class, dtype=np.int32)
+            return self._as_ndarray(self.nSV, nr_class, np.int32).copy()
+        return self.nSV[:nr_class] if self.nSV else [0] * nr_class
+
+    def get_rho(self, return_scipy=False):
+        n = self.nr_class * (self.nr_class - 1) // 2
+        if scipy != None and return_scipy:
+            return self._as_ndarray(self.rho, n, np.float64).copy()
+        return self.rho[:n]
+
     def is_probability_model(self):
         return (libsvm.svm_check_probability_model(self) == 1)
 
-    def get_sv_coef(self):
+    def _as_ndarray(self, ptr, n, dtype):
+        # Read-only ndarray view of n items at the ctypes pointer ptr. The
+        # memory belongs to the model, so the view keeps the model alive.
+        if n == 0 or not ptr:
+            return np.empty(0, dtype=dtype)
+        buf = (c_char * (n * np.dtype(dtype).itemsize)).from_address(cast(ptr, c_void_p).value)
+        buf._model = self
+        arr = np.frombuffer(buf, dtype=dtype)
+        arr.flags.writeable = False
+        return arr
+
+    def get_sv_coef(self, return_scipy=False):
+        """
+        With return_scipy=True, return sv_coef as an (nr_class-1, l)
+        ndarray. It is a read-only view of the model if sv_coef is one
+        block (e.g., a binary model loaded by svm_load_model), and
+        otherwise a copy made row by row.
+        """
+        if scipy != None and return_scipy:
+            m, l = self.nr_class - 1, self.l
+            if m <= 0 or l == 0:
+                return np.empty((max(m, 0), l))
+            rows = [self._as_ndarray(self.sv_coef[j], l, np.float64) for j in range(m)]
+            addr = [row.ctypes.data for row in rows]
+            if all(addr[j+1] - addr[j] == l * 8 for j in range(m-1)):
+                return self._as_ndarray(self.sv_coef[0], m*l, np.float64).reshape(m, l)
+            return np.vstack(rows)
         return [tuple(self.sv_coef[j][i] for j in range(self.nr_class - 1))
                 for i in range(self.l)]
 
-    def get_SV(self):
+    def build_inverted_index(self):
+        """
+        Build an inverted index of the SVs by feature so that later
+        predictions touch only the SV entries sharing a feature with the
+        instance; useful for sparse, high-dimensional models. Return
+        False if the model cannot be indexed (e.g., precomputed kernel).
+        """
+        return libsvm.svm_build_inverted_index(self) == 0
+
+    def get_linear_weights(self):
+        """
+        For a linear-kernel model, return the weight vectors of the
+        decision functions as a read-only (nr_func, w_dim) ndarray view,
+        in the order of rho; column k is feature index k. None is
+        returned if libsvm did not compute them (see svm_model.w in
+        LIBSVM README) or numpy is not available.
+        """
+        if scipy == None or not self.w:
+            return None
+        nr_func = 1
+        if self.param.svm_type in [svm_forms.C_SVC, svm_forms.NU_SVC]:
+            nr_func = self.nr_class * (self.nr_class - 1) // 2
+        return self._as_ndarray(self.w, nr_func * self.w_dim, np.float64).reshape(nr_func, self.w_dim)
+
+    def _get_SV_block(self):
+        # Return (nodes, offset): an svm_node ndarray viewing the memory
+        # holding all SVs and the offset of each SV in it, or None if
+        # SVs are not known to be in one block.
+        l = self.l
+        sv_ptr = self._as_ndarray(self.SV, l, np.uint64).astype(np.int64)
+        node_size = sizeof(svm_node)
+        if self.free_sv != 0:
+            # loaded models keep all SVs in one block starting at SV[0]
+            base = int(sv_ptr[0])
+            last = cast(c_void_p(int(sv_ptr.max())), POINTER(svm_node))
+            k = 0
+            while last[k].index != -1:
+                k += 1
+            size = (int(sv_ptr.max()) - base) // node_size + k + 1
+        elif isinstance(getattr(self, 'x_space', None), np.ndarray) and len(self.x_space) > 0:
+            # SVs point to the training problem; see svmutil.svm_train
+            base = self.x_space.ctypes.data
+            size = len(self.x_space)
+            if sv_ptr.min() < base or sv_ptr.max() >= base + size * node_size:
+                return None
+        else:
+            return None
+        nodes = self._as_ndarray(c_void_p(base), size, svm_node)
+        return nodes, (sv_ptr - base) // node_size
+
+    def get_SV(self, return_scipy=False):
+        """
+        With return_scipy=True, return SVs as an l * n csr_matrix, where
+        column j holds feature index j+1 (index j for precomputed kernel).
+        """
+        if scipy != None and return_scipy:
+            indx_start = 0 if self.param.kernel_type == kernel_names.PRECOMPUTED else 1
+            block = self._get_SV_block() if self.l > 0 else None
+            if block != None:
+                nodes, offset = block
+                term = np.flatnonzero(nodes['index'] == -1)
+                length = term[np.searchsorted(term, offset)] - offset
+                indptr = np.zeros(self.l + 1, dtype=np.int64)
+                np.cumsum(length, out=indptr[1:])
+                pos = np.repeat(offset - indptr[:-1], length) + np.arange(indptr[-1])
+                index = nodes['index'][pos] - indx_start
+                value = nodes['value'][pos]
+            else:
+                rows = self.get_SV()
+                indptr = np.zeros(self.l + 1, dtype=np.int64)
+                np.cumsum([len(row) for row in rows], out=indptr[1:])
+                index = np.array([k for row in rows for k in row], dtype=np.int64) - indx_start
+                value = np.array([v for row in rows for v in row.values()], dtype=np.float64)
+            n = int(index.max()) + 1 if len(index) > 0 else 0
+            return sparse.csr_matrix((value, index, indptr), shape=(self.l, n))
+
         result = []
         for sparse_sv in self.SV[:self.l]:
             row = dict()
@@ -427,6 +673,18 @@ class svm_model(Structure):
             result.append(row)
         return result
 
+def model_from_buffer(buf):
+    """
+    model_from_buffer(buf) -> svm_model
+
+    Create an svm_model from bytes saved by svm_save_model_buffer,
+    e.g., when unpickling a model.
+    """
+    model_ptr = libsvm.svm_load_model_buffer(buf, len(buf))
+    if not model_ptr:
+        raise ValueError("invalid binary model")
+    return toPyModel(model_ptr)
+
 def toPyModel(model_ptr):
     """
     toPyModel(model_ptr) -> svm_model
@@ -441,9 +699,21 @@ def toPyModel(model_ptr):
 
 fillprototype(libsvm.svm_train, POINTER(svm_model), [POINTER(svm_problem), POINTER(svm_parameter)])
 fillprototype(libsvm.svm_cross_validation, None, [POINTER(svm_problem), POINTER(svm_parameter), c_int, POINTER(c_double)])
+fillprototype(libsvm.svm_create_kernel_cache, c_void_p, [POINTER(svm_problem), POINTER(svm_parameter)])
+fillprototype(libsvm.svm_free_and_destroy_kernel_cache, None, [POINTER(c_void_p)])
+fillprototype(libsvm.svm_train_with_cache, POINTER(svm_model), [POINTER(svm_problem), POINTER(svm_parameter), c_void_p])
+fillprototype(libsvm.svm_train_warm_start, POINTER(svm_model), [POINTER(svm_problem), POINTER(svm_parameter), POINTER(svm_model), c_void_p])
+fillprototype(libsvm.svm_train_with_stats, POINTER(svm_model), [POINTER(svm_problem), POINTER(svm_parameter), POINTER(svm_model), c_void_p, POINTER(POINTER(svm_solver_stats))])
+fillprototype(libsvm.svm_free_solver_stats, None, [POINTER(POINTER(svm_solver_stats))])
+fillprototype(libsvm.svm_train_incremental, POINTER(svm_model), [POINTER(svm_problem), POINTER(svm_problem), POINTER(svm_parameter), POINTER(svm_model)])
+fillprototype(libsvm.svm_cross_validation_with_cache, None, [POINTER(svm_problem), POINTER(svm_parameter), c_int, POINTER(c_double), c_void_p])
 
 fillprototype(libsvm.svm_save_model, c_int, [c_char_p, POINTER(svm_model)])
 fillprototype(libsvm.svm_load_model, POINTER(svm_model), [c_char_p])
+fillprototype(libsvm.svm_save_model_binary, c_int, [c_char_p, POINTER(svm_model)])
+fillprototype(libsvm.svm_load_model_binary, POINTER(svm_model), [c_char_p])
+fillprototype(libsvm.svm_save_model_buffer, c_size_t, [POINTER(svm_model), c_char_p, c_size_t])
+fillprototype(libsvm.svm_load_model_buffer, POINTER(svm_model), [c_char_p, c_size_t])
 
 fillprototype(libsvm.svm_get_svm_type, c_int, [POINTER(svm_model)])
 fillprototype(libsvm.svm_get_nr_class, c_int, [POINTER(svm_model)])
@@ -454,12 +724,22 @@ fillprototype(libsvm.svm_get_svr_probability, c_double, [POINTER(svm_model)])
 
 fillprototype(libsvm.svm_predict_values, c_double, [POINTER(svm_model), POINTER(svm_node), POINTER(c_double)])
 fillprototype(libsvm.svm_predict, c_double, [POINTER(svm_model), POINTER(svm_node)])
+fillprototype(libsvm.svm_predict_values_dag, c_double, [POINTER(svm_model), POINTER(svm_node), POINTER(c_double)])
 fillprototype(libsvm.svm_predict_probability, c_double, [POINTER(svm_model), POINTER(svm_node), POINTER(c_double)])
+fillprototype(libsvm.svm_predict_batch, None, [POINTER(svm_model), POINTER(svm_problem), c_int, POINTER(c_double), POINTER(c_double)])
+fillprototype(libsvm.svm_predict_batch_dag, None, [POINTER(svm_model), POINTER(svm_problem), POINTER(c_double), POINTER(c_double)])
+
+fillprototype(libsvm.svm_build_inverted_index, c_int, [POINTER(svm_model)])
 
 fillprototype(libsvm.svm_free_model_content, None, [POINTER(svm_model)])
 fillprototype(libsvm.svm_free_and_destroy_model, None, [POINTER(POINTER(svm_model))])
 fillprototype(libsvm.svm_destroy_param, None, [POINTER(svm_parameter)])
 
 fillprototype(libsvm.svm_check_parameter, c_char_p, [POINTER(svm_problem), POINTER(svm_parameter)])
+fillprototype(libsvm.svm_check_parameter_incremental, c_char_p, [POINTER(svm_problem), POINTER(svm_problem), POINTER(svm_parameter)])
 fillprototype(libsvm.svm_check_probability_model, c_int, [POINTER(svm_model)])
 fillprototype(libsvm.svm_set_print_string_function, None, [PRINT_STRING_FUN])
+fillprototype(libsvm.svm_set_num_threads, c_int, [c_int])
+fillprototype(libsvm.svm_set_random_seed, None, [c_uint])
+
+fillprototype(libsvm.svm_parse_problem, c_int, [c_void_p, c_size_t, POINTER(c_double), POINTER(c_size_t), POINTER(c_int), POINTER(c_double), POINTER(c_int), POINTER(c_size_t)])
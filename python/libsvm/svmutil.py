@@ -1,8 +1,10 @@
-import os, sys
+import os, sys, mmap, struct
+from ctypes import c_int, c_size_t, c_void_p, addressof, byref, cast, sizeof, POINTER
 from .svm import *
 from .svm import __all__ as svm_all
 from .commonutil import *
 from .commonutil import __all__ as common_all
+from . import commonutil
 
 try:
     import numpy as np
@@ -19,9 +21,321 @@ if sys.version_info[0] < 3:
 else:
     _cstr = lambda s: bytes(s, "utf-8")
 
-__all__ = ['svm_load_model', 'svm_predict', 'svm_save_model', 'svm_train'] + svm_all + common_all
+__all__ = ['svm_batch_predictor', 'svm_iter_problem', 'svm_load_model', 'svm_load_problem', 'svm_predict',
+           'svm_read_problem_cached', 'svm_save_model', 'svm_save_problem', 'svm_train',
+           'svm_train_incremental', 'svm_train_path'] + svm_all + common_all
 
 
+def _parse_problem(buf, line_offset=0):
+    """
+    Parse LIBSVM-format bytes in the uint8 ndarray buf by svm_parse_problem
+    and return (y, rowptr, index, value) as ndarrays. line_offset is added
+    to the line number in the error message.
+    """
+    l = c_int()
+    nnz = c_size_t()
+    ptr = c_void_p(buf.ctypes.data)
+    err = libsvm.svm_parse_problem(ptr, len(buf), None, None, None, None, byref(l), byref(nnz))
+    if err == 0:
+        y = np.empty(l.value, dtype=np.float64)
+        rowptr = np.empty(l.value+1, dtype=np.uintp)
+        index = np.empty(nnz.value, dtype=np.int32)
+        value = np.empty(nnz.value, dtype=np.float64)
+        err = libsvm.svm_parse_problem(ptr, len(buf), y.ctypes.data_as(POINTER(c_double)),
+            rowptr.ctypes.data_as(POINTER(c_size_t)), index.ctypes.data_as(POINTER(c_int)),
+            value.ctypes.data_as(POINTER(c_double)), byref(l), byref(nnz))
+    if err != 0:
+        raise ValueError("Wrong input format at line %d" % (err + line_offset))
+    return y, rowptr.astype(np.int64), index, value
+
+def _parsed_to_csr(rowptr, index, value, indx_start, n_features=0):
+    """
+    Build a csr_matrix from the output of _parse_problem. Zero values are
+    dropped and column j of the matrix holds feature index j+indx_start.
+    """
+    nz = value != 0
+    if not nz.all():
+        rowptr = np.concatenate(([0], np.cumsum(nz)))[rowptr]
+        index = index[nz]
+        value = value[nz]
+    n = int(index.max()) - indx_start + 1 if len(index) > 0 else 0
+    n = max(n, n_features)
+    return sparse.csr_matrix((value, index - indx_start, rowptr), shape=(len(rowptr)-1, n))
+
+def _parse_file(path, start=0, end=None):
+    """
+    Memory-map the file path and parse bytes [start, end) of it, which must
+    begin at the start of a line, by _parse_problem.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return _parse_problem(np.empty(0, dtype=np.uint8))
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = np.frombuffer(data, dtype=np.uint8)
+        err_msg = None
+        try:
+            return _parse_problem(buf[start:end])
+        except ValueError:
+            # report the line number in the whole file
+            line_offset = int(np.count_nonzero(buf[:start] == ord('\n')))
+            try:
+                _parse_problem(buf[start:end], line_offset)
+            except ValueError as err:
+                err_msg = str(err)
+        finally:
+            # the mapping cannot be closed while buf refers to it
+            del buf
+            data.close()
+        raise ValueError(err_msg)
+
+def _parse_file_parallel(path, n_jobs):
+    """
+    Split the file path into n_jobs newline-aligned byte ranges, parse them
+    in a process pool and concatenate the results in order.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as f:
+        for k in range(1, n_jobs):
+            pos = max(size * k // n_jobs, bounds[-1])
+            f.seek(pos)
+            f.readline() # move to the start of the next line
+            bounds.append(f.tell())
+    bounds.append(size)
+    ranges = [(bounds[k], bounds[k+1]) for k in range(n_jobs) if bounds[k] < bounds[k+1]]
+
+    with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+        futures = [executor.submit(_parse_file, path, start, end) for start, end in ranges]
+        parts = [future.result() for future in futures]
+
+    y = np.concatenate([part[0] for part in parts])
+    index = np.concatenate([part[2] for part in parts])
+    value = np.concatenate([part[3] for part in parts])
+    rowptr = [np.zeros(1, dtype=np.int64)]
+    nnz = 0
+    for part in parts:
+        rowptr.append(part[1][1:] + nnz)
+        nnz += len(part[2])
+    return y, np.concatenate(rowptr), index, value
+
+def svm_read_problem(data_source, return_scipy=False, n_jobs=1):
+    """
+    svm_read_problem(data_source, return_scipy=False, n_jobs=1) -> [y, x], y: list, x: list of dictionary
+    svm_read_problem(data_source, return_scipy=True, n_jobs=1)  -> [y, x], y: ndarray, x: csr_matrix
+
+    Read LIBSVM-format data from data_source and return labels y
+    and data instances x. The data are parsed by the LIBSVM library;
+    without NumPy and SciPy, the pure-Python reader in commonutil is used.
+
+    If data_source is a file path, n_jobs > 1 parses the file in n_jobs
+    processes, each handling a range of lines (n_jobs = -1 uses all CPUs).
+    """
+    if scipy == None:
+        return commonutil.svm_read_problem(data_source, return_scipy)
+
+    if hasattr(data_source, "read"):
+        data = data_source.read()
+        if not isinstance(data, bytes):
+            data = data.encode("utf-8")
+        y, rowptr, index, value = _parse_problem(np.frombuffer(data, dtype=np.uint8))
+    else:
+        if n_jobs < 0:
+            n_jobs = os.cpu_count() or 1
+        # at least 1MB for each process
+        n_jobs = min(n_jobs, os.path.getsize(data_source) >> 20)
+        if n_jobs > 1:
+            y, rowptr, index, value = _parse_file_parallel(data_source, n_jobs)
+        else:
+            y, rowptr, index, value = _parse_file(data_source)
+
+    if return_scipy:
+        indx_start = 0 if (index == 0).any() else 1
+        return (y, _parsed_to_csr(rowptr, index, value, indx_start))
+
+    index = index.tolist()
+    value = value.tolist()
+    rowptr = rowptr.tolist()
+    x = [dict(zip(index[rowptr[i]:rowptr[i+1]], value[rowptr[i]:rowptr[i+1]])) for i in range(len(y))]
+    return (y.tolist(), x)
+
+def svm_iter_problem(data_source, chunk_rows=100000, n_features=0):
+    """
+    svm_iter_problem(data_source, chunk_rows=100000, n_features=0) -> generator of [y, x],
+        y: ndarray, x: csr_matrix
+
+    Read LIBSVM-format data from data_source (a file path or a file object)
+    and yield labels y and data instances x in blocks of chunk_rows
+    instances, so the whole data set is never held in memory. The last
+    block may be smaller.
+
+    As in svm_read_problem, feature indices start from 0 if index 0 appears
+    (precomputed kernels), otherwise from 1. The base is decided by the
+    first block; a ValueError is raised if index 0 appears later. x has at
+    least n_features columns, so blocks can have the same width.
+    """
+    if scipy == None:
+        raise ImportError("svm_iter_problem requires NumPy and SciPy")
+    if chunk_rows <= 0:
+        raise ValueError("chunk_rows must be positive")
+
+    if hasattr(data_source, "read"):
+        file = data_source
+    else:
+        file = open(data_source, "rb")
+    try:
+        indx_start = None
+        line_offset = 0
+        # Data not yet parsed is kept in parts, and only the new data of
+        # each read is scanned for newlines, so a block spanning many reads
+        # is neither copied nor scanned repeatedly.
+        parts = []
+        pending_len = 0
+        nr_pending_line = 0
+        while True:
+            data = file.read(1 << 24)
+            if not isinstance(data, bytes):
+                data = data.encode("utf-8")
+            eof = len(data) == 0
+            newline = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord('\n')) + pending_len
+            ends = list(newline[chunk_rows-1-nr_pending_line::chunk_rows] + 1)
+            nr_pending_line = (nr_pending_line + len(newline)) % chunk_rows
+            parts.append(data)
+            pending_len += len(data)
+            if eof and pending_len > (ends[-1] if ends else 0):
+                ends.append(pending_len)
+            if ends:
+                buf = np.frombuffer(b''.join(parts), dtype=np.uint8)
+                start = 0
+                for end in ends:
+                    y, rowptr, index, value = _parse_problem(buf[start:end], line_offset)
+                    if indx_start == None:
+                        indx_start = 0 if (index == 0).any() else 1
+                    elif indx_start == 1 and (index == 0).any():
+                        raise ValueError("index 0 found after line %d, but the feature index starts from 1 in the first block" % line_offset)
+                    yield (y, _parsed_to_csr(rowptr, index, value, indx_start, n_features))
+                    line_offset += len(y)
+                    start = end
+                parts = [buf[start:].tobytes()]
+                pending_len = len(parts[0])
+            if eof:
+                break
+    finally:
+        if not hasattr(data_source, "read"):
+            file.close()
+
+# header of a binary problem file: magic, version, isKernel, l, n,
+# number of svm_node, and size and mtime (ns) of the source data file
+_PROBLEM_MAGIC = b'LIBSVMPR'
+_PROBLEM_HEADER = struct.Struct('<8siiqqqqq')
+_PROBLEM_HEADER_SIZE = 64
+
+def svm_save_problem(problem_file_name, prob, isKernel=False, source=None):
+    """
+    svm_save_problem(problem_file_name, prob, isKernel=False, source=None) -> None
+
+    Save an svm_problem prob to a binary file, which svm_load_problem
+    maps back without parsing. The labels, row offsets and svm_node array
+    are stored in the native byte order. If source is the LIBSVM-format
+    file prob was read from, its size and modification time are stored
+    so svm_load_problem can detect a stale file.
+    """
+    if scipy == None:
+        raise ImportError("svm_save_problem requires NumPy and SciPy")
+    if isinstance(prob.x_space, np.ndarray):
+        x_space, rowptr = prob.x_space, prob.rowptr
+    else:
+        rows = [np.frombuffer(bytes(xi), dtype=svm_node) for xi in prob.x_space]
+        x_space = np.concatenate(rows) if rows else np.empty(0, dtype=svm_node)
+        rowptr = np.zeros(prob.l+1, dtype=np.int64)
+        np.cumsum([len(xi) for xi in rows], out=rowptr[1:])
+    y = np.ctypeslib.as_array(prob.y, (prob.l,)) if prob.l > 0 else np.empty(0)
+
+    src_size, src_mtime = -1, -1
+    if source != None:
+        st = os.stat(source)
+        src_size, src_mtime = st.st_size, st.st_mtime_ns
+
+    header = _PROBLEM_HEADER.pack(_PROBLEM_MAGIC, 1, int(isKernel), prob.l, prob.n,
+        len(x_space), src_size, src_mtime)
+    with open(problem_file_name, "wb") as f:
+        f.write(header.ljust(_PROBLEM_HEADER_SIZE, b'\0'))
+        f.write(np.ascontiguousarray(y, dtype=np.float64).tobytes())
+        f.write(np.ascontiguousarray(rowptr, dtype=np.int64).tobytes())
+        f.write(np.ascontiguousarray(x_space).tobytes())
+
+def svm_load_problem(problem_file_name, source=None, isKernel=None):
+    """
+    svm_load_problem(problem_file_name, source=None, isKernel=None) -> prob
+
+    Load an svm_problem saved by svm_save_problem. The svm_node array is
+    memory-mapped (copy-on-write) rather than read, so no feature data
+    are copied. If source is given and its size or modification time
+    differs from that recorded when saving, or isKernel differs from
+    the saved one, None is returned.
+    """
+    if scipy == None:
+        raise ImportError("svm_load_problem requires NumPy and SciPy")
+    with open(problem_file_name, "rb") as f:
+        header = f.read(_PROBLEM_HEADER_SIZE)
+    if len(header) != _PROBLEM_HEADER_SIZE or header[:len(_PROBLEM_MAGIC)] != _PROBLEM_MAGIC:
+        raise ValueError("%s is not a LIBSVM problem file" % problem_file_name)
+    magic, version, saved_isKernel, l, n, nr_node, src_size, src_mtime = \
+        _PROBLEM_HEADER.unpack_from(header)
+    if version != 1:
+        raise ValueError("unsupported problem file version %d" % version)
+
+    if source != None:
+        st = os.stat(source)
+        if (st.st_size, st.st_mtime_ns) != (src_size, src_mtime):
+            return None
+    if isKernel != None and bool(isKernel) != bool(saved_isKernel):
+        return None
+
+    def load(dtype, count, offset):
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(problem_file_name, dtype=dtype, mode='c', offset=offset, shape=(count,))
+
+    offset = _PROBLEM_HEADER_SIZE
+    y = load(np.float64, l, offset)
+    offset += 8*l
+    rowptr = np.asarray(load(np.int64, l+1, offset))
+    offset += 8*(l+1)
+    x_space = load(svm_node, nr_node, offset)
+
+    prob = svm_problem.__new__(svm_problem)
+    prob.l, prob.n = l, n
+    prob.y = (c_double * l)()
+    if l > 0:
+        np.ctypeslib.as_array(prob.y, (l,))[:] = y
+    prob.set_x_space(x_space, rowptr)
+    return prob
+
+def svm_read_problem_cached(data_source, cache_file_name=None, isKernel=False, n_jobs=1):
+    """
+    svm_read_problem_cached(data_source, cache_file_name=None, isKernel=False, n_jobs=1) -> prob
+
+    Return an svm_problem of the LIBSVM-format file data_source. The
+    problem is loaded by svm_load_problem from cache_file_name (default:
+    data_source + '.cache') if that file is up to date; otherwise
+    data_source is read by svm_read_problem and the cache is rewritten.
+    """
+    if cache_file_name == None:
+        cache_file_name = data_source + '.cache'
+    if os.path.exists(cache_file_name):
+        try:
+            prob = svm_load_problem(cache_file_name, source=data_source, isKernel=isKernel)
+            if prob != None:
+                return prob
+        except ValueError:
+            pass
+    y, x = svm_read_problem(data_source, return_scipy=True, n_jobs=n_jobs)
+    prob = svm_problem(y, x, isKernel=isKernel)
+    svm_save_problem(cache_file_name, prob, isKernel=isKernel, source=data_source)
+    return prob
+
 def svm_load_model(model_file_name):
     """
     svm_load_model(model_file_name) -> model
@@ -35,15 +349,20 @@ def svm_load_model(model_file_name):
     model = toPyModel(model)
     return model
 
-def svm_save_model(model_file_name, model):
+def svm_save_model(model_file_name, model, binary=False):
     """
-    svm_save_model(model_file_name, model) -> None
+    svm_save_model(model_file_name, model, binary=False) -> None
 
-    Save a LIBSVM model to the file model_file_name.
+    Save a LIBSVM model to the file model_file_name. If binary is True,
+    the model is saved in the binary format, which svm_load_model
+    loads by memory mapping.
     """
-    libsvm.svm_save_model(_cstr(model_file_name), model)
+    if binary:
+        libsvm.svm_save_model_binary(_cstr(model_file_name), model)
+    else:
+        libsvm.svm_save_model(_cstr(model_file_name), model)
 
-def svm_train(arg1, arg2=None, arg3=None):
+def svm_train(arg1, arg2=None, arg3=None, kernel_cache=None, init_model=None, return_stats=False):
     """
     svm_train(y, x [, options]) -> model | ACC | MSE
 
@@ -61,6 +380,13 @@ def svm_train(arg1, arg2=None, arg3=None):
     'options' or an svm_parameter param.
     If '-v' is specified in 'options' (i.e., cross validation)
     either accuracy (ACC) or mean-squared error (MSE) is returned.
+    kernel_cache: an svm_kernel_cache of prob; kernel values computed
+    in earlier calls with the same kernel parameters are reused.
+    init_model: a model trained on the same prob (C-SVC or epsilon-SVR);
+    its coefficients are the starting point of the solver.
+    return_stats: if True, (model, stats) is returned, where stats is a
+    list of svm_solver_stats, one for each sub-problem in the order of
+    model.rho.
     options:
         -s svm_type : set type of SVM (default 0)
             0 -- C-SVC        (multi-class classification)
@@ -80,12 +406,13 @@ def svm_train(arg1, arg2=None, arg3=None):
         -c cost : set the parameter C of C-SVC, epsilon-SVR, and nu-SVR (default 1)
         -n nu : set the parameter nu of nu-SVC, one-class SVM, and nu-SVR (default 0.5)
         -p epsilon : set the epsilon in loss function of epsilon-SVR (default 0.1)
-        -m cachesize : set cache memory size in MB (default 100)
+        -m cachesize : set cache memory size in MB, or auto[:max_MB] (default 100)
         -e epsilon : set tolerance of termination criterion (default 0.001)
         -h shrinking : whether to use the shrinking heuristics, 0 or 1 (default 1)
         -b probability_estimates : whether to train a model for probability estimates, 0 or 1 (default 0)
         -wi weight : set the parameter C of class i to weight*C, for C-SVC (default 1)
         -v n: n-fold cross validation mode
+        -j nr_thread : set the number of threads for training (default 1)
         -q : quiet mode (no outputs)
     """
     prob, param = None, None
@@ -120,9 +447,16 @@ def svm_train(arg1, arg2=None, arg3=None):
         raise ValueError('Error: %s' % err_msg)
 
     if param.cross_validation:
+        if init_model != None:
+            raise ValueError("init_model cannot be used with cross validation")
+        if return_stats:
+            raise ValueError("return_stats cannot be used with cross validation")
         l, nr_fold = prob.l, param.nr_fold
         target = (c_double * l)()
-        libsvm.svm_cross_validation(prob, param, nr_fold, target)
+        if kernel_cache:
+            libsvm.svm_cross_validation_with_cache(prob, param, nr_fold, target, kernel_cache.cache)
+        else:
+            libsvm.svm_cross_validation(prob, param, nr_fold, target)
         ACC, MSE, SCC = evaluations(prob.y[:l], target[:l])
         if param.svm_type in [svm_forms.EPSILON_SVR, svm_forms.NU_SVR]:
             print("Cross Validation Mean squared error = %g" % MSE)
@@ -132,16 +466,303 @@ def svm_train(arg1, arg2=None, arg3=None):
             print("Cross Validation Accuracy = %g%%" % ACC)
             return ACC
     else:
-        m = libsvm.svm_train(prob, param)
+        if return_stats:
+            stats_ptr = POINTER(svm_solver_stats)()
+            m = libsvm.svm_train_with_stats(prob, param, init_model,
+                                            kernel_cache.cache if kernel_cache else None,
+                                            byref(stats_ptr))
+            nr_stats = 1
+            if param.svm_type in [svm_forms.C_SVC, svm_forms.NU_SVC]:
+                nr_class = m.contents.nr_class
+                nr_stats = nr_class * (nr_class - 1) // 2
+            stats = [svm_solver_stats.from_buffer_copy(stats_ptr[i]) for i in range(nr_stats)]
+            libsvm.svm_free_solver_stats(byref(stats_ptr))
+        elif init_model != None:
+            m = libsvm.svm_train_warm_start(prob, param, init_model,
+                                            kernel_cache.cache if kernel_cache else None)
+        elif kernel_cache:
+            m = libsvm.svm_train_with_cache(prob, param, kernel_cache.cache)
+        else:
+            m = libsvm.svm_train(prob, param)
         m = toPyModel(m)
 
         # If prob is destroyed, data including SVs pointed by m can remain.
         m.x_space = prob.x_space
+        if return_stats:
+            return m, stats
         return m
 
-def svm_predict(y, x, m, options=""):
+def svm_train_incremental(old_prob, new_prob, model, options=''):
     """
-    svm_predict(y, x, m [, options]) -> (pred_labels, pred_metrics, pred_values)
+    svm_train_incremental(old_prob, new_prob, model [, options]) -> model
+
+    Train a model on the instances of old_prob followed by those of
+    new_prob. model must be trained on old_prob (by svm_train, or loaded
+    from a binary model file saved from it); the solver starts from its
+    coefficients and the instances of new_prob start from zero, so the
+    number of iterations depends on how much the solution changes.
+    Only C-SVC and epsilon-SVR models are used; otherwise training
+    starts from zero. options are the same as those of svm_train except
+    -v. sv_indices of the new model count instances of old_prob first.
+    """
+    if isinstance(options, svm_parameter):
+        param = options
+    else:
+        param = svm_parameter(options)
+    if param.cross_validation:
+        raise ValueError("svm_train_incremental does not support cross validation")
+    n = max(old_prob.n, new_prob.n)
+    if param.gamma == 0 and n > 0:
+        param.gamma = 1.0 / n
+    libsvm.svm_set_print_string_function(param.print_func)
+
+    m = libsvm.svm_train_incremental(old_prob, new_prob, param, model)
+    if not m:
+        err_msg = libsvm.svm_check_parameter_incremental(old_prob, new_prob, param)
+        raise ValueError('Error: %s' % err_msg)
+    m = toPyModel(m)
+    # SVs point to both problems; see svm_train
+    m.x_space = [old_prob.x_space, new_prob.x_space]
+    return m
+
+def svm_train_path(prob, C_list, options='', compare_cold=False):
+    """
+    svm_train_path(prob, C_list [, options [, compare_cold]]) -> (models, stats)
+
+    Train a model of prob for each C in C_list with the other parameters
+    in options. Each training starts from the solution of the previous
+    C (see init_model of svm_train), and all share one svm_kernel_cache,
+    so increasing values of C are preferred. stats[i] is a dictionary
+    with the C, the number of solver iterations ('iter', summed over
+    sub-problems), and the svm_solver_stats of the sub-problems
+    ('solver'). If compare_cold is True, each C is also trained from
+    scratch and 'cold_iter' is the number of iterations it takes.
+    """
+    param = svm_parameter(options)
+    if param.cross_validation:
+        raise ValueError("svm_train_path does not support cross validation")
+    if param.gamma == 0 and prob.n > 0:
+        param.gamma = 1.0 / prob.n
+
+    kernel_cache = svm_kernel_cache(prob, param)
+    models, stats = [], []
+    m = None
+    for C in C_list:
+        param.C = C
+        m, solver_stats = svm_train(prob, param, kernel_cache=kernel_cache, init_model=m, return_stats=True)
+        stat = {'C': C, 'iter': sum(s.iter for s in solver_stats), 'solver': solver_stats}
+        if compare_cold:
+            _, cold_stats = svm_train(prob, param, kernel_cache=kernel_cache, return_stats=True)
+            stat['cold_iter'] = sum(s.iter for s in cold_stats)
+        models.append(m)
+        stats.append(stat)
+    return models, stats
+
+def _predict_batch_parallel(m, prob, predict_probability, predict_dag, target, values, nr_value, n_jobs, omp_threads):
+    """
+    Split prob into n_jobs ranges of instances and call svm_predict_batch
+    (svm_predict_batch_dag if predict_dag) on them in a thread pool. ctypes releases the GIL during the calls, and
+    each range writes to its own part of target and values.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    x_addr = cast(prob.x, c_void_p).value
+    target_addr = addressof(target)
+    values_addr = addressof(values)
+    bounds = [prob.l * k // n_jobs for k in range(n_jobs + 1)]
+
+    def predict_range(start, end):
+        libsvm.svm_set_num_threads(omp_threads)
+        sub = svm_problem.__new__(svm_problem)
+        sub.l = end - start
+        sub.x = cast(c_void_p(x_addr + start * sizeof(c_void_p)), POINTER(POINTER(svm_node)))
+        sub_target = cast(c_void_p(target_addr + start * sizeof(c_double)), POINTER(c_double))
+        sub_values = cast(c_void_p(values_addr + start * nr_value * sizeof(c_double)), POINTER(c_double))
+        if predict_dag:
+            libsvm.svm_predict_batch_dag(m, sub, sub_target, sub_values)
+        else:
+            libsvm.svm_predict_batch(m, sub, predict_probability, sub_target, sub_values)
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        futures = [executor.submit(predict_range, bounds[k], bounds[k+1]) for k in range(n_jobs)]
+        for future in futures:
+            future.result()
+
+def _predict_linear(m, x):
+    """
+    Predict the rows of x (an ndarray or csr_matrix) by the weight vectors
+    of a linear-kernel model: the decision values are x.dot(W.T) - rho, and
+    labels are voted as in svm_predict_values. Return (labels, values) as
+    ndarrays, or None if the model has no weight vectors.
+    """
+    W = m.get_linear_weights()
+    if W is None:
+        return None
+    nr_func = W.shape[0]
+    # column j of x is feature index j+1
+    W = W[:, 1:]
+    if x.shape[1] > W.shape[1]:
+        x = x[:, :W.shape[1]]
+    else:
+        W = W[:, :x.shape[1]]
+    dec_values = np.asarray(x.dot(W.T)) - np.ctypeslib.as_array(m.rho, (nr_func,))
+    return _labels_from_dec_values(m, dec_values), dec_values
+
+def _labels_from_dec_values(m, dec_values):
+    """
+    Predicted labels from an l * nr_func ndarray of decision values, as
+    svm_predict_values does (one-vs-one voting for classification).
+    """
+    svm_type = m.get_svm_type()
+    if svm_type == svm_forms.ONE_CLASS:
+        return np.where(dec_values[:, 0] > 0, 1.0, -1.0)
+    elif svm_type in [svm_forms.EPSILON_SVR, svm_forms.NU_SVR]:
+        return dec_values[:, 0].copy()
+    nr_class = m.get_nr_class()
+    vote = np.zeros((dec_values.shape[0], nr_class), dtype=np.int32)
+    p = 0
+    for i in range(nr_class):
+        for j in range(i+1, nr_class):
+            positive = dec_values[:, p] > 0
+            vote[:, i] += positive
+            vote[:, j] += ~positive
+            p += 1
+    return np.array(m.get_labels(), dtype=np.float64)[vote.argmax(axis=1)]
+
+class svm_batch_predictor(object):
+    """
+    svm_batch_predictor(m [, memory_limit]) -> predictor
+
+    Predict many instances with the model m by matrix operations in
+    NumPy/SciPy instead of one kernel evaluation at a time. The SVs are
+    exported once as a csr_matrix (an ndarray if they are mostly
+    nonzero), with their squared norms for the RBF kernel. Kernel values
+    of the instances are computed as x.dot(SV.T) in tiles of at most
+    memory_limit MB (default 64), the kernel function is applied
+    elementwise, and decision values and labels follow the layout of
+    sv_coef and rho and the one-vs-one voting of svm_predict.
+
+    >>> predictor = svm_batch_predictor(m)
+    >>> pred_labels, dec_values = predictor.predict(x)
+
+    x is an l * n ndarray or scipy spmatrix, where column j holds feature
+    index j+1. Probability estimates and precomputed kernels are not
+    supported. Decision values agree with svm_predict up to rounding.
+    """
+    def __init__(self, m, memory_limit=64):
+        if not scipy:
+            raise ImportError("svm_batch_predictor needs numpy and scipy")
+        if m.param.kernel_type == kernel_names.PRECOMPUTED:
+            raise ValueError("svm_batch_predictor does not support precomputed kernel")
+        self.model = m
+        self.memory_limit = memory_limit
+        self.kernel_type = m.param.kernel_type
+        self.degree, self.gamma, self.coef0 = m.param.degree, m.param.gamma, m.param.coef0
+
+        SV = m.get_SV(return_scipy=True).tocsr()
+        l, n = SV.shape
+        if SV.nnz > 0.5 * l * n:
+            SV = SV.toarray()
+        if m.sv_square:
+            self.sv_square = m._as_ndarray(m.sv_square, l, np.float64)
+        elif isinstance(SV, np.ndarray):
+            self.sv_square = np.einsum('ij,ij->i', SV, SV)
+        else:
+            self.sv_square = np.asarray(SV.multiply(SV).sum(axis=1)).ravel()
+        self.SV_T = SV.T
+        self.l, self.n = l, n
+
+        # coef[k, p]: coefficient of SV k in decision function p
+        sv_coef = m.get_sv_coef(return_scipy=True)
+        self.rho = m.get_rho(return_scipy=True)
+        if m.get_svm_type() in [svm_forms.C_SVC, svm_forms.NU_SVC]:
+            nr_class = m.get_nr_class()
+            start = np.concatenate(([0], np.cumsum(m.get_nSV(return_scipy=True))))
+            rows, cols, data = [], [], []
+            p = 0
+            for i in range(nr_class):
+                for j in range(i+1, nr_class):
+                    # see svm_predict_values for the layout of sv_coef
+                    rows += [np.arange(start[i], start[i+1]), np.arange(start[j], start[j+1])]
+                    data += [sv_coef[j-1, start[i]:start[i+1]], sv_coef[i, start[j]:start[j+1]]]
+                    cols.append(np.full(start[i+1] - start[i] + start[j+1] - start[j], p))
+                    p += 1
+            if p > 0:
+                rows, cols, data = np.concatenate(rows), np.concatenate(cols), np.concatenate(data)
+            self.coef_T = sparse.csr_matrix((data, (cols, rows)), shape=(p, l))
+        else:
+            self.coef_T = sparse.csr_matrix(sv_coef[:1])
+
+    def _kernel(self, x, x_square):
+        # kernel values between the rows of x and all SVs as an ndarray
+        if sparse.issparse(x) and not sparse.issparse(self.SV_T):
+            x = x.toarray()  # dense SVs: use BLAS
+        if sparse.issparse(self.SV_T) and not sparse.issparse(x):
+            # ndarray.dot does not take a sparse matrix
+            K = self.SV_T.T.dot(x.T).T
+        else:
+            K = x.dot(self.SV_T)
+        K = K.toarray() if sparse.issparse(K) else np.asarray(K)
+        if self.kernel_type == kernel_names.RBF:
+            K *= -2
+            K += x_square[:, None]
+            K += self.sv_square[None, :]
+            np.maximum(K, 0, out=K)
+            K *= -self.gamma
+            np.exp(K, out=K)
+        elif self.kernel_type == kernel_names.POLY:
+            K *= self.gamma
+            K += self.coef0
+            K **= self.degree
+        elif self.kernel_type == kernel_names.SIGMOID:
+            K *= self.gamma
+            K += self.coef0
+            np.tanh(K, out=K)
+        return K
+
+    def decision_values(self, x):
+        """
+        Return the l * nr_func ndarray of decision values of x.
+        """
+        # features beyond those of the SVs only count in the norm of x
+        if sparse.issparse(x):
+            x = x.tocsr()
+            x_square = np.asarray(x.multiply(x).sum(axis=1)).ravel()
+            if x.shape[1] > self.n:
+                x = x[:, :self.n]
+            elif x.shape[1] < self.n:
+                x = sparse.csr_matrix((x.data, x.indices, x.indptr), shape=(x.shape[0], self.n))
+        else:
+            x = np.asarray(x, dtype=np.float64)
+            if x.ndim == 1:
+                x = x.reshape(1, -1)
+            x_square = np.einsum('ij,ij->i', x, x)
+            if x.shape[1] > self.n:
+                x = x[:, :self.n]
+            elif x.shape[1] < self.n:
+                x = np.hstack([x, np.zeros((x.shape[0], self.n - x.shape[1]))])
+
+        nr_instance = x.shape[0]
+        dec_values = np.empty((nr_instance, self.coef_T.shape[0]))
+        # the tile of kernel values and its temporaries
+        tile = max(1, int(self.memory_limit * (1 << 20) // (16 * max(self.l, 1))))
+        for begin in range(0, nr_instance, tile):
+            end = min(begin + tile, nr_instance)
+            K = self._kernel(x[begin:end], x_square[begin:end])
+            dec_values[begin:end] = self.coef_T.dot(K.T).T
+        dec_values -= self.rho
+        return dec_values
+
+    def predict(self, x):
+        """
+        Return (pred_labels, dec_values) of x as ndarrays.
+        """
+        dec_values = self.decision_values(x)
+        return _labels_from_dec_values(self.model, dec_values), dec_values
+
+def svm_predict(y, x, m, options="", n_jobs=1, omp_threads=None):
+    """
+    svm_predict(y, x, m [, options, n_jobs, omp_threads]) -> (pred_labels, pred_metrics, pred_values)
 
     y: a list/tuple/ndarray of l true labels (type must be int/double).
        It is used for calculating the accuracy. Use [] if true labels are
@@ -156,7 +777,21 @@ def svm_predict(y, x, m, options=""):
     options:
         -b probability_estimates: whether to predict probability estimates,
             0 or 1 (default 0).
+        -d dag: whether to predict by a decision DAG of k-1 binary SVMs
+            instead of voting, 0 or 1 (default 0); for classification
+            without -b 1.
         -q : quiet mode (no outputs).
+    n_jobs: number of threads predicting disjoint ranges of instances
+        (default 1; -1 for all CPUs).
+    omp_threads: number of OpenMP threads used by each of the n_jobs threads
+        if LIBSVM is built with OpenMP (default: number of CPUs // n_jobs
+        when n_jobs > 1).
+
+    For a linear-kernel model with weight vectors (see
+    svm_model.get_linear_weights) and x given as an ndarray or spmatrix,
+    decision values are computed as one matrix product x.dot(W.T) in
+    numpy/scipy (without -b 1 or -d 1); n_jobs and omp_threads are not
+    used then.
 
     The return tuple contains
     pred_labels: a list of predicted labels
@@ -165,8 +800,9 @@ def svm_predict(y, x, m, options=""):
     pred_values: a list of decision values or probability estimates (if '-b 1'
             is specified). If k is the number of classes, for decision values,
             each element includes results of predicting k(k-1)/2 binary-class
-            SVMs. For probabilities, each element contains k values indicating
-            the probability that the testing instance is in each class.
+            SVMs; with '-d 1', the values of SVMs not evaluated are 0. For
+            probabilities, each element contains k values indicating the
+            probability that the testing instance is in each class.
             Note that the order of classes here is the same as 'model.label'
             field in the model structure.
     """
@@ -185,23 +821,28 @@ def svm_predict(y, x, m, options=""):
         raise TypeError("type of y: {0} is not supported!".format(type(y)))
 
     predict_probability = 0
+    predict_dag = 0
     argv = options.split()
     i = 0
     while i < len(argv):
         if argv[i] == '-b':
             i += 1
             predict_probability = int(argv[i])
+        elif argv[i] == '-d':
+            i += 1
+            predict_dag = int(argv[i])
         elif argv[i] == '-q':
             info = print_null
         else:
             raise ValueError("Wrong options")
         i+=1
 
+    if predict_probability and predict_dag:
+        raise ValueError("-d 1 cannot be used with -b 1")
+
     svm_type = m.get_svm_type()
     is_prob_model = m.is_probability_model()
     nr_class = m.get_nr_class()
-    pred_labels = []
-    pred_values = []
 
     if scipy and isinstance(x, sparse.spmatrix):
         nr_instance = x.shape[0]
@@ -217,38 +858,50 @@ def svm_predict(y, x, m, options=""):
             "z: Laplace distribution e^(-|z|/sigma)/(2sigma),sigma=%g" % m.get_svr_probability());
             nr_class = 0
 
-        prob_estimates = (c_double * nr_class)()
-        for i in range(nr_instance):
-            if scipy and isinstance(x, sparse.spmatrix):
-                indslice = slice(x.indptr[i], x.indptr[i+1])
-                xi, idx = gen_svm_nodearray((x.indices[indslice], x.data[indslice]), isKernel=(m.param.kernel_type == kernel_names.PRECOMPUTED))
-            else:
-                xi, idx = gen_svm_nodearray(x[i], isKernel=(m.param.kernel_type == kernel_names.PRECOMPUTED))
-            label = libsvm.svm_predict_probability(m, xi, prob_estimates)
-            values = prob_estimates[:nr_class]
-            pred_labels += [label]
-            pred_values += [values]
+        nr_value = nr_class
     else:
         if is_prob_model:
             info("Model supports probability estimates, but disabled in predicton.")
-        if svm_type in [svm_forms.ONE_CLASS, svm_forms.EPSILON_SVR, svm_forms.NU_SVC]:
-            nr_classifier = 1
+        if svm_type in [svm_forms.ONE_CLASS, svm_forms.EPSILON_SVR, svm_forms.NU_SVR]:
+            nr_value = 1
         else:
-            nr_classifier = nr_class*(nr_class-1)//2
-        dec_values = (c_double * nr_classifier)()
-        for i in range(nr_instance):
-            if scipy and isinstance(x, sparse.spmatrix):
-                indslice = slice(x.indptr[i], x.indptr[i+1])
-                xi, idx = gen_svm_nodearray((x.indices[indslice], x.data[indslice]), isKernel=(m.param.kernel_type == kernel_names.PRECOMPUTED))
-            else:
-                xi, idx = gen_svm_nodearray(x[i], isKernel=(m.param.kernel_type == kernel_names.PRECOMPUTED))
-            label = libsvm.svm_predict_values(m, xi, dec_values)
-            if(nr_class == 1):
-                values = [1]
+            nr_value = nr_class*(nr_class-1)//2
+
+    linear = None
+    if not predict_probability and not predict_dag and scipy and isinstance(x, (np.ndarray, sparse.spmatrix)):
+        linear = _predict_linear(m, x)
+    if linear is not None:
+        pred_labels, pred_values = linear[0].tolist(), linear[1].tolist()
+    else:
+        # All instances are packed into one svm_problem and predicted by a
+        # single call, so no per-instance Python work is done in between.
+        if scipy and isinstance(x, (np.ndarray, sparse.spmatrix)):
+            prob_y = np.zeros(nr_instance)
+        else:
+            prob_y = [0] * nr_instance
+        prob = svm_problem(prob_y, x, isKernel=(m.param.kernel_type == kernel_names.PRECOMPUTED))
+        target = (c_double * nr_instance)()
+        values = (c_double * (nr_instance * nr_value))()
+        if n_jobs < 0:
+            n_jobs = os.cpu_count() or 1
+        n_jobs = max(1, min(n_jobs, nr_instance))
+        if n_jobs == 1:
+            if predict_dag:
+                libsvm.svm_predict_batch_dag(m, prob, target, values)
             else:
-                values = dec_values[:nr_classifier]
-            pred_labels += [label]
-            pred_values += [values]
+                libsvm.svm_predict_batch(m, prob, predict_probability, target, values)
+        else:
+            if omp_threads == None:
+                omp_threads = max(1, (os.cpu_count() or 1) // n_jobs)
+            _predict_batch_parallel(m, prob, predict_probability, predict_dag, target, values, nr_value, n_jobs, omp_threads)
+
+        pred_labels = target[:nr_instance]
+        if not predict_probability and nr_class == 1:
+            pred_values = [[1] for i in range(nr_instance)]
+        elif scipy:
+            pred_values = np.ctypeslib.as_array(values, (nr_instance * nr_value,)).reshape(nr_instance, nr_value).tolist()
+        else:
+            pred_values = [values[i*nr_value:(i+1)*nr_value] for i in range(nr_instance)]
 
     if len(y) == 0:
         y = [0] * nr_instance
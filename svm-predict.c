@@ -14,6 +14,7 @@ int max_nr_attr = 64;
 
 struct svm_model* model;
 int predict_probability=0;
+int predict_dag=0;
 
 static char *line = NULL;
 static int max_line_len;
@@ -52,6 +53,7 @@ void predict(FILE *input, FILE *output)
 	int svm_type=svm_get_svm_type(model);
 	int nr_class=svm_get_nr_class(model);
 	double *prob_estimates=NULL;
+	double *dec_values=NULL;
 	int j;
 
 	if(predict_probability)
@@ -77,6 +79,9 @@ void predict(FILE *input, FILE *output)
 		}
 	}
 
+	if(predict_dag)
+		dec_values = (double *) malloc(nr_class*(nr_class-1)/2*sizeof(double));
+
 	max_line_len = 1024;
 	line = (char *)malloc(max_line_len*sizeof(char));
 	while(readline(input) != NULL)
@@ -133,7 +138,10 @@ void predict(FILE *input, FILE *output)
 		}
 		else
 		{
-			predict_label = svm_predict(model,x);
+			if(predict_dag)
+				predict_label = svm_predict_values_dag(model,x,dec_values);
+			else
+				predict_label = svm_predict(model,x);
 			fprintf(output,"%.17g\n",predict_label);
 		}
 
@@ -160,6 +168,7 @@ void predict(FILE *input, FILE *output)
 			(double)correct/total*100,correct,total);
 	if(predict_probability)
 		free(prob_estimates);
+	free(dec_values);
 }
 
 void exit_with_help()
@@ -168,6 +177,7 @@ void exit_with_help()
 	"Usage: svm-predict [options] test_file model_file output_file\n"
 	"options:\n"
 	"-b probability_estimates: whether to predict probability estimates, 0 or 1 (default 0); for one-class SVM only 0 is supported\n"
+	"-d dag: whether to predict by a decision DAG of k-1 binary SVMs instead of voting, 0 or 1 (default 0); for classification without probability estimates\n"
 	"-q : quiet mode (no outputs)\n"
 	);
 	exit(1);
@@ -187,6 +197,9 @@ int main(int argc, char **argv)
 			case 'b':
 				predict_probability = atoi(argv[i]);
 				break;
+			case 'd':
+				predict_dag = atoi(argv[i]);
+				break;
 			case 'q':
 				info = &print_null;
 				i--;
@@ -221,6 +234,11 @@ int main(int argc, char **argv)
 	}
 
 	x = (struct svm_node *) malloc(max_nr_attr*sizeof(struct svm_node));
+	if(predict_probability && predict_dag)
+	{
+		fprintf(stderr,"-d 1 cannot be used with -b 1\n");
+		exit(1);
+	}
 	if(predict_probability)
 	{
 		if(svm_check_probability_model(model)==0)
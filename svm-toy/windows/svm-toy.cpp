@@ -192,6 +192,8 @@ void button_run_clicked()
 	param.p = 0.1;
 	param.shrinking = 1;
 	param.probability = 0;
+	param.nr_thread = 1;
+	param.auto_cache = 0;
 	param.nr_weight = 0;
 	param.weight_label = NULL;
 	param.weight = NULL;
@@ -7,10 +7,18 @@
 #include <stdarg.h>
 #include <limits.h>
 #include <locale.h>
+#include <errno.h>
+#include <time.h>
 #include "svm.h"
 #ifdef _OPENMP
 #include <omp.h>
 #endif
+#include <stdint.h>
+#ifndef _WIN32
+#include <sys/mman.h>
+#include <fcntl.h>
+#include <unistd.h>
+#endif
 
 int libsvm_version = LIBSVM_VERSION;
 typedef float Qfloat;
@@ -62,6 +70,76 @@ static void info(const char *fmt,...)
 static void info(const char *fmt,...) {}
 #endif
 
+// available physical memory in MB, 0 if unknown
+static double available_memory()
+{
+#ifdef __linux__
+	FILE *fp = fopen("/proc/meminfo","r");
+	if(fp != NULL)
+	{
+		char line[256];
+		double kb;
+		while(fgets(line,sizeof(line),fp) != NULL)
+			if(sscanf(line,"MemAvailable: %lf kB",&kb) == 1)
+			{
+				fclose(fp);
+				return kb/1024;
+			}
+		fclose(fp);
+	}
+#endif
+#if defined(_SC_AVPHYS_PAGES) && defined(_SC_PAGESIZE)
+	long nr_page = sysconf(_SC_AVPHYS_PAGES);
+	long page_size = sysconf(_SC_PAGESIZE);
+	if(nr_page > 0 && page_size > 0)
+		return (double)nr_page*(double)page_size/(1<<20);
+#endif
+	return 0;
+}
+
+// Return the memory (in MB) that can be used for caching. With
+// param->auto_cache, it is half of the available memory, at most
+// cache_size MB if cache_size > 0.
+static double cache_budget(const svm_parameter *param)
+{
+	if(!param->auto_cache)
+		return param->cache_size;
+	double budget = available_memory()/2;
+	if(param->cache_size > 0 && (budget <= 0 || budget > param->cache_size))
+		budget = param->cache_size;
+	if(budget <= 0)
+		budget = 100;	// unknown available memory
+	return budget;
+}
+
+// cache_size of each of nr_thread concurrent trainings. An automatic size
+// stays automatic, with the budget split among the threads as its limit.
+static double split_cache_size(const svm_parameter *param, int nr_thread)
+{
+	return cache_budget(param)/nr_thread;
+}
+
+// cache size (in MB) for the kernel matrix of l instances: an automatic
+// size is just large enough to keep the whole matrix if the budget, less
+// reserved MB used by other caches, allows
+static double kernel_cache_size(const svm_parameter *param, int l, double reserved = 0)
+{
+	if(!param->auto_cache)
+		return param->cache_size;
+	double full_size = ((double)l*l*sizeof(Qfloat)+64.0*l)/(1<<20)+1;
+	return max(min(cache_budget(param)-reserved,full_size),1.0);
+}
+
+// elapsed time in seconds; CPU time is used if OpenMP is not available
+static double wall_time()
+{
+#ifdef _OPENMP
+	return omp_get_wtime();
+#else
+	return (double)clock()/CLOCKS_PER_SEC;
+#endif
+}
+
 //
 // Kernel Cache
 //
@@ -79,6 +157,9 @@ public:
 	// (p >= len if nothing needs to be filled)
 	int get_data(const int index, Qfloat **data, int len);
 	void swap_index(int i, int j);
+
+	long long nr_hit;	// requests found in the cache
+	long long nr_miss;	// requests that need (part of) the data filled
 private:
 	int l;
 	size_t size;
@@ -97,6 +178,7 @@ private:
 
 Cache::Cache(int l_,size_t size_):l(l_),size(size_)
 {
+	nr_hit = nr_miss = 0;
 	head = (head_t *)calloc(l,sizeof(head_t));	// initialized to 0
 	size /= sizeof(Qfloat);
 	size_t header_size = l * sizeof(head_t) / sizeof(Qfloat);
@@ -135,6 +217,8 @@ int Cache::get_data(const int index, Qfloat **data, int len)
 
 	if(more > 0)
 	{
+		++nr_miss;
+
 		// free old space
 		while(size < (size_t)more)
 		{
@@ -151,6 +235,8 @@ int Cache::get_data(const int index, Qfloat **data, int len)
 		size -= more;  // previous while loop guarantees size >= more and subtraction of size_t variable will not underflow
 		swap(h->len,len);
 	}
+	else
+		++nr_hit;
 
 	lru_insert(h);
 	*data = h->data;
@@ -188,6 +274,52 @@ void Cache::swap_index(int i, int j)
 	}
 }
 
+//
+// Kernel values shared by a sequence of trainings
+//
+// Row k holds kernel values between instance k of the problem given to
+// svm_create_kernel_cache and all its instances. An instance of a
+// (sub)problem is found by its svm_node pointer. Entries are computed
+// on demand; NaN marks those not computed yet.
+//
+struct svm_kernel_cache
+{
+	struct node_index
+	{
+		const svm_node *x;
+		int index;
+	};
+
+	int l;
+	node_index *x_index;	// sorted by x
+	int kernel_type;
+	int degree;
+	double gamma;
+	double coef0;
+	Cache *cache;
+	double size;	// size of cache in MB
+};
+
+// the shared cache is used only if it is for the same kernel
+static bool kernel_cache_matches(const svm_kernel_cache *cache, const svm_parameter *param)
+{
+	return cache->kernel_type == param->kernel_type &&
+	       cache->degree == param->degree &&
+	       cache->gamma == param->gamma &&
+	       cache->coef0 == param->coef0;
+}
+
+static int compare_node_index(const void *a, const void *b)
+{
+	const svm_node *x = ((const svm_kernel_cache::node_index *)a)->x;
+	const svm_node *y = ((const svm_kernel_cache::node_index *)b)->x;
+	if(x < y)
+		return -1;
+	else if(x > y)
+		return 1;
+	return 0;
+}
+
 //
 // Kernel evaluation
 //
@@ -200,26 +332,64 @@ public:
 	virtual Qfloat *get_Q(int column, int len) const = 0;
 	virtual double *get_QD() const = 0;
 	virtual void swap_index(int i, int j) const = 0;
+	// fill nr_kernel_eval, nr_cache_hit and nr_cache_miss of stats
+	virtual void get_stats(svm_solver_stats *stats) const = 0;
 	virtual ~QMatrix() {}
 };
 
 class Kernel: public QMatrix {
 public:
-	Kernel(int l, svm_node * const * x, const svm_parameter& param);
+	Kernel(int l, svm_node * const * x, const svm_parameter& param, svm_kernel_cache *shared_cache = NULL);
 	virtual ~Kernel();
 
 	static double k_function(const svm_node *x, const svm_node *y,
 				 const svm_parameter& param);
+	// k_function with given x^T x and y^T y for the RBF kernel
+	static double k_function(const svm_node *x, const svm_node *y,
+				 const svm_parameter& param, double x_square, double y_square);
 	virtual Qfloat *get_Q(int column, int len) const = 0;
 	virtual double *get_QD() const = 0;
+	virtual void get_stats(svm_solver_stats *stats) const = 0;
 	virtual void swap_index(int i, int j) const	// no so const...
 	{
 		swap(x[i],x[j]);
 		if(x_square) swap(x_square[i],x_square[j]);
+		if(shared_index) swap(shared_index[i],shared_index[j]);
 	}
 protected:
 
 	double (Kernel::*kernel_function)(int i, int j) const;
+	mutable long long nr_kernel_eval;
+
+	// shared cache row of instance i, NULL if there is none
+	Qfloat *get_shared_row(int i) const
+	{
+		if(shared_index == NULL || shared_index[i] < 0)
+			return NULL;
+		Qfloat *row;
+		int start, l = shared_cache->l;
+		if((start = shared_cache->cache->get_data(shared_index[i],&row,l)) < l)
+			for(int k=start;k<l;k++)
+				row[k] = (Qfloat)NAN;
+		return row;
+	}
+	// kernel value (i,j), looked up in the shared cache row of i if given;
+	// nr_eval is increased if the value is computed
+	double shared_kernel(Qfloat *row, int i, int j, long long& nr_eval) const
+	{
+		int k;
+		if(row == NULL || (k = shared_index[j]) < 0)
+		{
+			++nr_eval;
+			return (this->*kernel_function)(i,j);
+		}
+		if(row[k] != row[k])
+		{
+			++nr_eval;
+			row[k] = (Qfloat)(this->*kernel_function)(i,j);
+		}
+		return row[k];
+	}
 
 private:
 	const svm_node **x;
@@ -231,6 +401,9 @@ private:
 	const double gamma;
 	const double coef0;
 
+	svm_kernel_cache *shared_cache;
+	int *shared_index;	// row of each instance in shared_cache, -1 if not found
+
 	static double dot(const svm_node *px, const svm_node *py);
 	double kernel_linear(int i, int j) const
 	{
@@ -254,7 +427,7 @@ private:
 	}
 };
 
-Kernel::Kernel(int l, svm_node * const * x_, const svm_parameter& param)
+Kernel::Kernel(int l, svm_node * const * x_, const svm_parameter& param, svm_kernel_cache *shared_cache_)
 :kernel_type(param.kernel_type), degree(param.degree),
  gamma(param.gamma), coef0(param.coef0)
 {
@@ -278,6 +451,7 @@ Kernel::Kernel(int l, svm_node * const * x_, const svm_parameter& param)
 	}
 
 	clone(x,x_,l);
+	nr_kernel_eval = 0;
 
 	if(kernel_type == RBF)
 	{
@@ -287,12 +461,29 @@ Kernel::Kernel(int l, svm_node * const * x_, const svm_parameter& param)
 	}
 	else
 		x_square = 0;
+
+	shared_cache = NULL;
+	shared_index = NULL;
+	if(shared_cache_ != NULL && kernel_cache_matches(shared_cache_,&param))
+	{
+		shared_cache = shared_cache_;
+		shared_index = new int[l];
+		for(int i=0;i<l;i++)
+		{
+			svm_kernel_cache::node_index key, *found;
+			key.x = x[i];
+			found = (svm_kernel_cache::node_index *)bsearch(&key,shared_cache->x_index,
+				shared_cache->l,sizeof(svm_kernel_cache::node_index),compare_node_index);
+			shared_index[i] = found ? found->index : -1;
+		}
+	}
 }
 
 Kernel::~Kernel()
 {
 	delete[] x;
 	delete[] x_square;
+	delete[] shared_index;
 }
 
 double Kernel::dot(const svm_node *px, const svm_node *py)
@@ -376,6 +567,14 @@ double Kernel::k_function(const svm_node *x, const svm_node *y,
 	}
 }
 
+double Kernel::k_function(const svm_node *x, const svm_node *y,
+			  const svm_parameter& param, double x_square, double y_square)
+{
+	if(param.kernel_type == RBF)
+		return exp(-param.gamma*(x_square+y_square-2*dot(x,y)));
+	return k_function(x,y,param);
+}
+
 // An SMO algorithm in Fan et al., JMLR 6(2005), p. 1889--1918
 // Solves:
 //
@@ -405,6 +604,7 @@ public:
 		double upper_bound_p;
 		double upper_bound_n;
 		double r;	// for Solver_NU
+		svm_solver_stats stats;	// time is not filled by Solve
 	};
 
 	void Solve(int l, const QMatrix& Q, const double *p_, const schar *y_,
@@ -426,6 +626,7 @@ protected:
 	double *G_bar;		// gradient, if we treat free variables as 0
 	int l;
 	bool unshrink;	// XXX
+	int nr_reconstruct;
 
 	double get_C(int i)
 	{
@@ -471,6 +672,7 @@ void Solver::reconstruct_gradient()
 
 	int i,j;
 	int nr_free = 0;
+	++nr_reconstruct;
 
 	for(j=active_size;j<l;j++)
 		G[j] = G_bar[j] + p[j];
@@ -519,6 +721,7 @@ void Solver::Solve(int l, const QMatrix& Q, const double *p_, const schar *y_,
 	this->Cn = Cn;
 	this->eps = eps;
 	unshrink = false;
+	nr_reconstruct = 0;
 
 	// initialize alpha_status
 	{
@@ -564,6 +767,8 @@ void Solver::Solve(int l, const QMatrix& Q, const double *p_, const schar *y_,
 	int iter = 0;
 	int max_iter = max(10000000, l>INT_MAX/100 ? INT_MAX : 100*l);
 	int counter = min(l,1000)+1;
+	int nr_shrink = 0;
+	int last_active_size = l;
 
 	while(iter < max_iter)
 	{
@@ -572,7 +777,13 @@ void Solver::Solve(int l, const QMatrix& Q, const double *p_, const schar *y_,
 		if(--counter == 0)
 		{
 			counter = min(l,1000);
-			if(shrinking) do_shrinking();
+			if(shrinking)
+			{
+				int old_active_size = active_size;
+				do_shrinking();
+				if(active_size < old_active_size)
+					++nr_shrink;
+			}
 			info(".");
 		}
 
@@ -580,6 +791,7 @@ void Solver::Solve(int l, const QMatrix& Q, const double *p_, const schar *y_,
 		if(select_working_set(i,j)!=0)
 		{
 			// reconstruct the whole gradient
+			last_active_size = active_size;
 			reconstruct_gradient();
 			// reset active set size and check
 			active_size = l;
@@ -734,6 +946,7 @@ void Solver::Solve(int l, const QMatrix& Q, const double *p_, const schar *y_,
 
 	if(iter >= max_iter)
 	{
+		last_active_size = active_size;
 		if(active_size < l)
 		{
 			// reconstruct the whole gradient to calculate objective value
@@ -775,6 +988,12 @@ void Solver::Solve(int l, const QMatrix& Q, const double *p_, const schar *y_,
 	si->upper_bound_p = Cp;
 	si->upper_bound_n = Cn;
 
+	si->stats.iter = iter;
+	si->stats.nr_shrink = nr_shrink;
+	si->stats.nr_reconstruct = nr_reconstruct;
+	si->stats.active_size = last_active_size;
+	Q.get_stats(&si->stats);
+
 	info("\noptimization finished, #iter = %d\n",iter);
 
 	delete[] p;
@@ -1270,14 +1489,15 @@ double Solver_NU::calculate_rho()
 class SVC_Q: public Kernel
 {
 public:
-	SVC_Q(const svm_problem& prob, const svm_parameter& param, const schar *y_)
-	:Kernel(prob.l, prob.x, param)
+	SVC_Q(const svm_problem& prob, const svm_parameter& param, const schar *y_, svm_kernel_cache *shared_cache)
+	:Kernel(prob.l, prob.x, param, shared_cache)
 	{
 		clone(y,y_,prob.l);
 		cache = new Cache(prob.l,(size_t)(param.cache_size*(1<<20)));
 		QD = new double[prob.l];
 		for(int i=0;i<prob.l;i++)
 			QD[i] = (this->*kernel_function)(i,i);
+		nr_kernel_eval = prob.l;
 	}
 
 	Qfloat *get_Q(int i, int len) const
@@ -1286,11 +1506,26 @@ public:
 		int start, j;
 		if((start = cache->get_data(i,&data,len)) < len)
 		{
+			Qfloat *row = get_shared_row(i);
+			if(row)
+			{
+				long long nr_eval = 0;
+#ifdef _OPENMP
+#pragma omp parallel for private(j) reduction(+:nr_eval) schedule(guided)
+#endif
+				for(j=start;j<len;j++)
+					data[j] = (Qfloat)(y[i]*y[j]*shared_kernel(row,i,j,nr_eval));
+				nr_kernel_eval += nr_eval;
+			}
+			else
+			{
 #ifdef _OPENMP
 #pragma omp parallel for private(j) schedule(guided)
 #endif
-			for(j=start;j<len;j++)
-				data[j] = (Qfloat)(y[i]*y[j]*(this->*kernel_function)(i,j));
+				for(j=start;j<len;j++)
+					data[j] = (Qfloat)(y[i]*y[j]*(this->*kernel_function)(i,j));
+				nr_kernel_eval += len-start;
+			}
 		}
 		return data;
 	}
@@ -1300,6 +1535,13 @@ public:
 		return QD;
 	}
 
+	void get_stats(svm_solver_stats *stats) const
+	{
+		stats->nr_kernel_eval = nr_kernel_eval;
+		stats->nr_cache_hit = cache->nr_hit;
+		stats->nr_cache_miss = cache->nr_miss;
+	}
+
 	void swap_index(int i, int j) const
 	{
 		cache->swap_index(i,j);
@@ -1323,13 +1565,14 @@ private:
 class ONE_CLASS_Q: public Kernel
 {
 public:
-	ONE_CLASS_Q(const svm_problem& prob, const svm_parameter& param)
-	:Kernel(prob.l, prob.x, param)
+	ONE_CLASS_Q(const svm_problem& prob, const svm_parameter& param, svm_kernel_cache *shared_cache)
+	:Kernel(prob.l, prob.x, param, shared_cache)
 	{
 		cache = new Cache(prob.l,(size_t)(param.cache_size*(1<<20)));
 		QD = new double[prob.l];
 		for(int i=0;i<prob.l;i++)
 			QD[i] = (this->*kernel_function)(i,i);
+		nr_kernel_eval = prob.l;
 	}
 
 	Qfloat *get_Q(int i, int len) const
@@ -1338,8 +1581,16 @@ public:
 		int start, j;
 		if((start = cache->get_data(i,&data,len)) < len)
 		{
-			for(j=start;j<len;j++)
-				data[j] = (Qfloat)(this->*kernel_function)(i,j);
+			Qfloat *row = get_shared_row(i);
+			if(row)
+				for(j=start;j<len;j++)
+					data[j] = (Qfloat)shared_kernel(row,i,j,nr_kernel_eval);
+			else
+			{
+				for(j=start;j<len;j++)
+					data[j] = (Qfloat)(this->*kernel_function)(i,j);
+				nr_kernel_eval += len-start;
+			}
 		}
 		return data;
 	}
@@ -1349,6 +1600,13 @@ public:
 		return QD;
 	}
 
+	void get_stats(svm_solver_stats *stats) const
+	{
+		stats->nr_kernel_eval = nr_kernel_eval;
+		stats->nr_cache_hit = cache->nr_hit;
+		stats->nr_cache_miss = cache->nr_miss;
+	}
+
 	void swap_index(int i, int j) const
 	{
 		cache->swap_index(i,j);
@@ -1369,8 +1627,8 @@ private:
 class SVR_Q: public Kernel
 {
 public:
-	SVR_Q(const svm_problem& prob, const svm_parameter& param)
-	:Kernel(prob.l, prob.x, param)
+	SVR_Q(const svm_problem& prob, const svm_parameter& param, svm_kernel_cache *shared_cache)
+	:Kernel(prob.l, prob.x, param, shared_cache)
 	{
 		l = prob.l;
 		cache = new Cache(l,(size_t)(param.cache_size*(1<<20)));
@@ -1386,6 +1644,7 @@ public:
 			QD[k] = (this->*kernel_function)(k,k);
 			QD[k+l] = QD[k];
 		}
+		nr_kernel_eval = l;
 		buffer[0] = new Qfloat[2*l];
 		buffer[1] = new Qfloat[2*l];
 		next_buffer = 0;
@@ -1404,11 +1663,26 @@ public:
 		int j, real_i = index[i];
 		if(cache->get_data(real_i,&data,l) < l)
 		{
+			Qfloat *row = get_shared_row(real_i);
+			if(row)
+			{
+				long long nr_eval = 0;
+#ifdef _OPENMP
+#pragma omp parallel for private(j) reduction(+:nr_eval) schedule(guided)
+#endif
+				for(j=0;j<l;j++)
+					data[j] = (Qfloat)shared_kernel(row,real_i,j,nr_eval);
+				nr_kernel_eval += nr_eval;
+			}
+			else
+			{
 #ifdef _OPENMP
 #pragma omp parallel for private(j) schedule(guided)
 #endif
-			for(j=0;j<l;j++)
-				data[j] = (Qfloat)(this->*kernel_function)(real_i,j);
+				for(j=0;j<l;j++)
+					data[j] = (Qfloat)(this->*kernel_function)(real_i,j);
+				nr_kernel_eval += l;
+			}
 		}
 
 		// reorder and copy
@@ -1425,6 +1699,13 @@ public:
 		return QD;
 	}
 
+	void get_stats(svm_solver_stats *stats) const
+	{
+		stats->nr_kernel_eval = nr_kernel_eval;
+		stats->nr_cache_hit = cache->nr_hit;
+		stats->nr_cache_miss = cache->nr_miss;
+	}
+
 	~SVR_Q()
 	{
 		delete cache;
@@ -1447,9 +1728,45 @@ private:
 //
 // construct and solve various formulations
 //
+
+// Set alpha to r*y_i*coef_i, where coef holds the coefficients of a
+// previous solution (e.g., sv_coef) and scale is the ratio of the new and
+// old C. If most variables are at the old upper bound, r = scale keeps
+// them bounded; otherwise r = 1. r is reduced if needed to fit in the
+// upper bounds. alpha is unchanged if coef does not give a feasible point
+// (0 <= alpha_i, y^T alpha = 0).
+static void seed_alpha(int l, const double *coef, const schar *y,
+	double Cp, double Cn, double scale, double *alpha)
+{
+	int i, nSV = 0, nBSV = 0;
+	double r = INF, sum = 0, sum_abs = 0;
+	for(i=0;i<l;i++)
+	{
+		double a = y[i]*coef[i];
+		double C = (y[i] > 0)? Cp : Cn;
+		if(a < 0)
+			return;
+		if(a > 0)
+		{
+			++nSV;
+			if(a >= C/scale*(1-1e-12))
+				++nBSV;
+			r = min(r, C/a);
+		}
+		sum += coef[i];
+		sum_abs += fabs(coef[i]);
+	}
+	if(fabs(sum) > 1e-8*sum_abs)
+		return;
+	r = min(r, (2*nBSV >= nSV)? scale : 1.0);
+	for(i=0;i<l;i++)
+		alpha[i] = r*y[i]*coef[i];
+}
+
 static void solve_c_svc(
 	const svm_problem *prob, const svm_parameter* param,
-	double *alpha, Solver::SolutionInfo* si, double Cp, double Cn)
+	double *alpha, Solver::SolutionInfo* si, double Cp, double Cn,
+	svm_kernel_cache *cache, const double *init_coef, double init_scale)
 {
 	int l = prob->l;
 	double *minus_ones = new double[l];
@@ -1463,9 +1780,11 @@ static void solve_c_svc(
 		minus_ones[i] = -1;
 		if(prob->y[i] > 0) y[i] = +1; else y[i] = -1;
 	}
+	if(init_coef)
+		seed_alpha(l,init_coef,y,Cp,Cn,init_scale,alpha);
 
 	Solver s;
-	s.Solve(l, SVC_Q(*prob,*param,y), minus_ones, y,
+	s.Solve(l, SVC_Q(*prob,*param,y,cache), minus_ones, y,
 		alpha, Cp, Cn, param->eps, si, param->shrinking);
 
 	double sum_alpha=0;
@@ -1484,7 +1803,7 @@ static void solve_c_svc(
 
 static void solve_nu_svc(
 	const svm_problem *prob, const svm_parameter *param,
-	double *alpha, Solver::SolutionInfo* si)
+	double *alpha, Solver::SolutionInfo* si, svm_kernel_cache *cache)
 {
 	int i;
 	int l = prob->l;
@@ -1519,7 +1838,7 @@ static void solve_nu_svc(
 		zeros[i] = 0;
 
 	Solver_NU s;
-	s.Solve(l, SVC_Q(*prob,*param,y), zeros, y,
+	s.Solve(l, SVC_Q(*prob,*param,y,cache), zeros, y,
 		alpha, 1.0, 1.0, param->eps, si,  param->shrinking);
 	double r = si->r;
 
@@ -1539,7 +1858,7 @@ static void solve_nu_svc(
 
 static void solve_one_class(
 	const svm_problem *prob, const svm_parameter *param,
-	double *alpha, Solver::SolutionInfo* si)
+	double *alpha, Solver::SolutionInfo* si, svm_kernel_cache *cache)
 {
 	int l = prob->l;
 	double *zeros = new double[l];
@@ -1562,7 +1881,7 @@ static void solve_one_class(
 	}
 
 	Solver s;
-	s.Solve(l, ONE_CLASS_Q(*prob,*param), zeros, ones,
+	s.Solve(l, ONE_CLASS_Q(*prob,*param,cache), zeros, ones,
 		alpha, 1.0, 1.0, param->eps, si, param->shrinking);
 
 	delete[] zeros;
@@ -1571,7 +1890,8 @@ static void solve_one_class(
 
 static void solve_epsilon_svr(
 	const svm_problem *prob, const svm_parameter *param,
-	double *alpha, Solver::SolutionInfo* si)
+	double *alpha, Solver::SolutionInfo* si, svm_kernel_cache *cache,
+	const double *init_coef, double init_scale)
 {
 	int l = prob->l;
 	double *alpha2 = new double[2*l];
@@ -1589,9 +1909,21 @@ static void solve_epsilon_svr(
 		linear_term[i+l] = param->p + prob->y[i];
 		y[i+l] = -1;
 	}
+	if(init_coef)
+	{
+		// coef_i = alpha_i - alpha*_i
+		double *coef2 = new double[2*l];
+		for(i=0;i<l;i++)
+		{
+			coef2[i] = max(init_coef[i],0.0);
+			coef2[i+l] = min(init_coef[i],0.0);
+		}
+		seed_alpha(2*l,coef2,y,param->C,param->C,init_scale,alpha2);
+		delete[] coef2;
+	}
 
 	Solver s;
-	s.Solve(2*l, SVR_Q(*prob,*param), linear_term, y,
+	s.Solve(2*l, SVR_Q(*prob,*param,cache), linear_term, y,
 		alpha2, param->C, param->C, param->eps, si, param->shrinking);
 
 	double sum_alpha = 0;
@@ -1609,7 +1941,7 @@ static void solve_epsilon_svr(
 
 static void solve_nu_svr(
 	const svm_problem *prob, const svm_parameter *param,
-	double *alpha, Solver::SolutionInfo* si)
+	double *alpha, Solver::SolutionInfo* si, svm_kernel_cache *cache)
 {
 	int l = prob->l;
 	double C = param->C;
@@ -1632,7 +1964,7 @@ static void solve_nu_svr(
 	}
 
 	Solver_NU s;
-	s.Solve(2*l, SVR_Q(*prob,*param), linear_term, y,
+	s.Solve(2*l, SVR_Q(*prob,*param,cache), linear_term, y,
 		alpha2, C, C, param->eps, si, param->shrinking);
 
 	info("epsilon = %f\n",-si->r);
@@ -1652,32 +1984,44 @@ struct decision_function
 {
 	double *alpha;
 	double rho;
+	svm_solver_stats stats;
 };
 
 static decision_function svm_train_one(
 	const svm_problem *prob, const svm_parameter *param,
-	double Cp, double Cn)
+	double Cp, double Cn, svm_kernel_cache *cache,
+	const double *init_coef = NULL, double init_scale = 1)
 {
 	double *alpha = Malloc(double,prob->l);
 	Solver::SolutionInfo si;
+	svm_parameter solver_param = *param;
+	// with a shared kernel cache, both caches come out of the same budget
+	double reserved = 0;
+	if(cache != NULL && kernel_cache_matches(cache,param))
+		reserved = cache->size;
+	solver_param.cache_size = kernel_cache_size(param,prob->l,reserved);
+	solver_param.auto_cache = 0;
+	param = &solver_param;
+	double start_time = wall_time();
 	switch(param->svm_type)
 	{
 		case C_SVC:
-			solve_c_svc(prob,param,alpha,&si,Cp,Cn);
+			solve_c_svc(prob,param,alpha,&si,Cp,Cn,cache,init_coef,init_scale);
 			break;
 		case NU_SVC:
-			solve_nu_svc(prob,param,alpha,&si);
+			solve_nu_svc(prob,param,alpha,&si,cache);
 			break;
 		case ONE_CLASS:
-			solve_one_class(prob,param,alpha,&si);
+			solve_one_class(prob,param,alpha,&si,cache);
 			break;
 		case EPSILON_SVR:
-			solve_epsilon_svr(prob,param,alpha,&si);
+			solve_epsilon_svr(prob,param,alpha,&si,cache,init_coef,init_scale);
 			break;
 		case NU_SVR:
-			solve_nu_svr(prob,param,alpha,&si);
+			solve_nu_svr(prob,param,alpha,&si,cache);
 			break;
 	}
+	si.stats.time = wall_time()-start_time;
 
 	info("obj = %f, rho = %f\n",si.obj,si.rho);
 
@@ -1708,6 +2052,7 @@ static decision_function svm_train_one(
 	decision_function f;
 	f.alpha = alpha;
 	f.rho = si.rho;
+	f.stats = si.stats;
 	return f;
 }
 
@@ -1899,23 +2244,59 @@ static void multiclass_probability(int k, double **r, double *p)
 	free(Qp);
 }
 
+// Random permutation for the cross validation in
+// svm_binary_svc_probability. It is drawn separately so that parallel
+// training consumes rand() in the same order as serial training.
+static int *svm_binary_svc_probability_perm(int l)
+{
+	int *perm = Malloc(int,l);
+	for(int i=0;i<l;i++) perm[i]=i;
+	for(int i=0;i<l;i++)
+	{
+		int j = i+rand()%(l-i);
+		swap(perm[i],perm[j]);
+	}
+	return perm;
+}
+
+// Submodels of cross validation and probability training are evaluated
+// by the kernel sums of svm_predict_values without the weight vectors or
+// SV norms, whose rounding differs, so that trained models and CV results
+// do not depend on them.
+static void drop_prediction_shortcuts(svm_model *model)
+{
+	free(model->w);
+	model->w = NULL;
+	model->w_dim = 0;
+	free(model->sv_square);
+	model->sv_square = NULL;
+}
+
 // Using cross-validation decision values to get parameters for SVC probability estimates
+// Up to param->nr_thread folds are trained in parallel (serially if a kernel cache is given)
 static void svm_binary_svc_probability(
 	const svm_problem *prob, const svm_parameter *param,
-	double Cp, double Cn, double& probA, double& probB)
+	double Cp, double Cn, double& probA, double& probB, svm_kernel_cache *cache,
+	const int *perm)
 {
 	int i;
 	int nr_fold = 5;
-	int *perm = Malloc(int,prob->l);
 	double *dec_values = Malloc(double,prob->l);
 
-	// random shuffle
-	for(i=0;i<prob->l;i++) perm[i]=i;
-	for(i=0;i<prob->l;i++)
-	{
-		int j = i+rand()%(prob->l-i);
-		swap(perm[i],perm[j]);
-	}
+	int nr_thread = min(param->nr_thread,nr_fold);
+	if(cache != NULL)
+		nr_thread = 1;
+#ifndef _OPENMP
+	nr_thread = 1;	// folds run serially, so each can use the whole cache
+#endif
+	svm_parameter fold_param = *param;
+	if(nr_thread > 1)
+		fold_param.cache_size = split_cache_size(param,nr_thread);
+	fold_param.nr_thread = 1;
+
+#ifdef _OPENMP
+#pragma omp parallel for private(i) schedule(dynamic) num_threads(nr_thread) if(nr_thread > 1)
+#endif
 	for(i=0;i<nr_fold;i++)
 	{
 		int begin = i*prob->l/nr_fold;
@@ -1958,7 +2339,7 @@ static void svm_binary_svc_probability(
 				dec_values[perm[j]] = -1;
 		else
 		{
-			svm_parameter subparam = *param;
+			svm_parameter subparam = fold_param;
 			subparam.probability=0;
 			subparam.C=1.0;
 			subparam.nr_weight=2;
@@ -1968,7 +2349,8 @@ static void svm_binary_svc_probability(
 			subparam.weight_label[1]=-1;
 			subparam.weight[0]=Cp;
 			subparam.weight[1]=Cn;
-			struct svm_model *submodel = svm_train(&subprob,&subparam);
+			struct svm_model *submodel = svm_train_with_cache(&subprob,&subparam,cache);
+			drop_prediction_shortcuts(submodel);
 			for(j=begin;j<end;j++)
 			{
 				svm_predict_values(submodel,prob->x[perm[j]],&(dec_values[perm[j]]));
@@ -1983,7 +2365,6 @@ static void svm_binary_svc_probability(
 	}
 	sigmoid_train(prob->l,dec_values,prob->y,probA,probB);
 	free(dec_values);
-	free(perm);
 }
 
 // Binning method from the oneclass_prob paper by Que and Lin to predict the probability as a normal instance (i.e., not an outlier)
@@ -2008,6 +2389,22 @@ static double predict_one_class_probability(const svm_model *model, double dec_v
 	return prob_estimate;
 }
 
+// size of a one-vs-one sub-problem, for ordering pairs in svm_train
+struct pair_size
+{
+	int size;
+	int index;
+};
+
+static int compare_pair_size(const void *a, const void *b)
+{
+	const pair_size *pa = (const pair_size *)a;
+	const pair_size *pb = (const pair_size *)b;
+	if(pa->size != pb->size)
+		return pb->size - pa->size;
+	return pa->index - pb->index;
+}
+
 static int compare_double(const void *a, const void *b)
 {
 	if(*(double *)a > *(double *)b)
@@ -2065,7 +2462,7 @@ static int svm_one_class_probability(const svm_problem *prob, const svm_model *m
 
 // Return parameter of a Laplace distribution
 static double svm_svr_probability(
-	const svm_problem *prob, const svm_parameter *param)
+	const svm_problem *prob, const svm_parameter *param, svm_kernel_cache *cache)
 {
 	int i;
 	int nr_fold = 5;
@@ -2074,7 +2471,7 @@ static double svm_svr_probability(
 
 	svm_parameter newparam = *param;
 	newparam.probability = 0;
-	svm_cross_validation(prob,&newparam,nr_fold,ymv);
+	svm_cross_validation_with_cache(prob,&newparam,nr_fold,ymv,cache);
 	for(i=0;i<prob->l;i++)
 	{
 		ymv[i]=prob->y[i]-ymv[i];
@@ -2178,9 +2575,160 @@ static void svm_group_classes(const svm_problem *prob, int *nr_class_ret, int **
 //
 svm_model *svm_train(const svm_problem *prob, const svm_parameter *param)
 {
+	return svm_train_with_cache(prob,param,NULL);
+}
+
+svm_model *svm_train_with_cache(const svm_problem *prob, const svm_parameter *param, svm_kernel_cache *cache)
+{
+	return svm_train_warm_start(prob,param,NULL,cache);
+}
+
+// init_model can seed C-SVC and epsilon-SVR trainings on the same data
+static bool can_warm_start(const svm_problem *prob, const svm_parameter *param, const svm_model *init_model)
+{
+	if(init_model == NULL || init_model->param.svm_type != param->svm_type ||
+	   init_model->sv_indices == NULL)
+		return false;
+	if(param->svm_type == C_SVC)
+	{
+		if(init_model->label == NULL || init_model->nSV == NULL)
+			return false;
+	}
+	else if(param->svm_type != EPSILON_SVR)
+		return false;
+	for(int i=0;i<init_model->l;i++)
+		if(init_model->sv_indices[i] < 1 || init_model->sv_indices[i] > prob->l)
+			return false;
+	return true;
+}
+
+// For a linear kernel, set model->w to the weight vectors of the decision
+// functions, w = sum_i coef_i SV_i, so that prediction needs one sparse dot
+// per function instead of one per SV. The dense vectors are kept only if
+// they take no more memory than the SVs (or less than 1 MB).
+static void svm_compute_linear_weights(svm_model *model)
+{
+	model->w = NULL;
+	model->w_dim = 0;
+	if(model->param.kernel_type != LINEAR || model->l == 0)
+		return;
+
+	int svm_type = model->param.svm_type;
+	int nr_class = model->nr_class;
+	int l = model->l;
+	int nr_func;
+	if(svm_type == C_SVC || svm_type == NU_SVC)
+	{
+		if(nr_class < 2 || model->nSV == NULL)
+			return;
+		nr_func = nr_class*(nr_class-1)/2;
+	}
+	else
+		nr_func = 1;
+
+	int i, w_dim = 0;
+	size_t nnz = 0;
+	for(i=0;i<l;i++)
+		for(const svm_node *px=model->SV[i];px->index!=-1;px++)
+		{
+			if(px->index < 0)
+				return;
+			w_dim = max(w_dim,px->index+1);
+			++nnz;
+		}
+	if((double)nr_func*w_dim > max(2.0*(double)nnz,(double)(1<<17)))
+		return;
+
+	double *w = Malloc(double,(size_t)nr_func*w_dim);
+	for(size_t k=0;k<(size_t)nr_func*w_dim;k++)
+		w[k] = 0;
+
+	if(svm_type == C_SVC || svm_type == NU_SVC)
+	{
+		int *start = Malloc(int,nr_class);
+		start[0] = 0;
+		for(i=1;i<nr_class;i++)
+			start[i] = start[i-1]+model->nSV[i-1];
+
+		// see svm_predict_values for the layout of sv_coef
+		int p = 0;
+		for(i=0;i<nr_class;i++)
+			for(int j=i+1;j<nr_class;j++)
+			{
+				double *wp = &w[(size_t)p*w_dim];
+				int k;
+				for(k=start[i];k<start[i]+model->nSV[i];k++)
+					for(const svm_node *px=model->SV[k];px->index!=-1;px++)
+						wp[px->index] += model->sv_coef[j-1][k]*px->value;
+				for(k=start[j];k<start[j]+model->nSV[j];k++)
+					for(const svm_node *px=model->SV[k];px->index!=-1;px++)
+						wp[px->index] += model->sv_coef[i][k]*px->value;
+				++p;
+			}
+		free(start);
+	}
+	else
+	{
+		for(i=0;i<l;i++)
+			for(const svm_node *px=model->SV[i];px->index!=-1;px++)
+				w[px->index] += model->sv_coef[0][i]*px->value;
+	}
+
+	model->w = w;
+	model->w_dim = w_dim;
+}
+
+static double dot_self(const svm_node *x)
+{
+	double sum = 0;
+	for(;x->index!=-1;x++)
+		sum += x->value*x->value;
+	return sum;
+}
+
+// For the RBF kernel, set model->sv_square[i] = ||SV_i||^2 so that
+// prediction needs only x^T SV_i for each SV.
+static void svm_compute_sv_square(svm_model *model)
+{
+	model->sv_square = NULL;
+	if(model->param.kernel_type != RBF || model->l <= 0)
+		return;
+
+	int l = model->l;
+	double *sv_square = Malloc(double,l);
+	for(int i=0;i<l;i++)
+		sv_square[i] = dot_self(model->SV[i]);
+	model->sv_square = sv_square;
+}
+
+// x^T w for a dense vector w of w_dim features
+static double dot_dense(const svm_node *x, const double *w, int w_dim)
+{
+	double sum = 0;
+	for(;x->index!=-1;x++)
+		if(x->index >= 0 && x->index < w_dim)
+			sum += x->value*w[x->index];
+	return sum;
+}
+
+svm_model *svm_train_warm_start(const svm_problem *prob, const svm_parameter *param, const svm_model *init_model, svm_kernel_cache *cache)
+{
+	return svm_train_with_stats(prob,param,init_model,cache,NULL);
+}
+
+svm_model *svm_train_with_stats(const svm_problem *prob, const svm_parameter *param, const svm_model *init_model, svm_kernel_cache *cache, svm_solver_stats **stats)
+{
+	if(!can_warm_start(prob,param,init_model))
+		init_model = NULL;
+
 	svm_model *model = Malloc(svm_model,1);
 	model->param = *param;
 	model->free_sv = 0;	// XXX
+	model->image_size = 0;
+	model->w = NULL;
+	model->w_dim = 0;
+	model->sv_square = NULL;
+	model->inverted_index = NULL;
 
 	if(param->svm_type == ONE_CLASS ||
 	   param->svm_type == EPSILON_SVR ||
@@ -2194,9 +2742,25 @@ svm_model *svm_train(const svm_problem *prob, const svm_parameter *param)
 		model->prob_density_marks = NULL;
 		model->sv_coef = Malloc(double *,1);
 
-		decision_function f = svm_train_one(prob,param,0,0);
+		double *init_coef = NULL;
+		if(init_model)
+		{
+			init_coef = Malloc(double,prob->l);
+			for(int i=0;i<prob->l;i++)
+				init_coef[i] = 0;
+			for(int i=0;i<init_model->l;i++)
+				init_coef[init_model->sv_indices[i]-1] = init_model->sv_coef[0][i];
+		}
+		decision_function f = svm_train_one(prob,param,0,0,cache,init_coef,
+			init_model ? param->C/init_model->param.C : 1);
+		free(init_coef);
 		model->rho = Malloc(double,1);
 		model->rho[0] = f.rho;
+		if(stats)
+		{
+			*stats = Malloc(svm_solver_stats,1);
+			(*stats)[0] = f.stats;
+		}
 
 		int nSV = 0;
 		int i;
@@ -2221,7 +2785,7 @@ svm_model *svm_train(const svm_problem *prob, const svm_parameter *param)
 		    param->svm_type == NU_SVR))
 		{
 			model->probA = Malloc(double,1);
-			model->probA[0] = svm_svr_probability(prob,param);
+			model->probA[0] = svm_svr_probability(prob,param,cache);
 		}
 		else if(param->probability && param->svm_type == ONE_CLASS)
 		{
@@ -2273,80 +2837,195 @@ svm_model *svm_train(const svm_problem *prob, const svm_parameter *param)
 				weighted_C[j] *= param->weight[i];
 		}
 
+		// for warm start: position of each instance in init_model->SV (-1 if
+		// not an SV), and the start of each class of init_model in SV
+		int *init_pos = NULL;
+		int *init_start = NULL;
+		if(init_model)
+		{
+			init_pos = Malloc(int,l);
+			for(i=0;i<l;i++)
+				init_pos[i] = -1;
+			for(i=0;i<init_model->l;i++)
+				init_pos[init_model->sv_indices[i]-1] = i;
+			init_start = Malloc(int,init_model->nr_class+1);
+			init_start[0] = 0;
+			for(i=0;i<init_model->nr_class;i++)
+				init_start[i+1] = init_start[i]+init_model->nSV[i];
+		}
+
 		// train k*(k-1)/2 models
 
+		int nr_pair = nr_class*(nr_class-1)/2;
 		bool *nonzero = Malloc(bool,l);
 		for(i=0;i<l;i++)
 			nonzero[i] = false;
-		decision_function *f = Malloc(decision_function,nr_class*(nr_class-1)/2);
+		decision_function *f = Malloc(decision_function,nr_pair);
 
 		double *probA=NULL,*probB=NULL;
 		if (param->probability)
 		{
-			probA=Malloc(double,nr_class*(nr_class-1)/2);
-			probB=Malloc(double,nr_class*(nr_class-1)/2);
+			probA=Malloc(double,nr_pair);
+			probB=Malloc(double,nr_pair);
 		}
 
+		// pairs are solved largest first so that big sub-problems do not
+		// end up last when they are spread over threads; results are
+		// stored by pair index, so the model does not depend on the order
+		int *pair_i = Malloc(int,nr_pair);
+		int *pair_j = Malloc(int,nr_pair);
+		pair_size *order = Malloc(pair_size,nr_pair);
 		int p = 0;
 		for(i=0;i<nr_class;i++)
 			for(int j=i+1;j<nr_class;j++)
 			{
-				svm_problem sub_prob;
-				int si = start[i], sj = start[j];
-				int ci = count[i], cj = count[j];
-				sub_prob.l = ci+cj;
-				sub_prob.x = Malloc(svm_node *,sub_prob.l);
-				sub_prob.y = Malloc(double,sub_prob.l);
-				int k;
-				for(k=0;k<ci;k++)
-				{
-					sub_prob.x[k] = x[si+k];
-					sub_prob.y[k] = +1;
-				}
-				for(k=0;k<cj;k++)
-				{
-					sub_prob.x[ci+k] = x[sj+k];
-					sub_prob.y[ci+k] = -1;
-				}
-
-				if(param->probability)
-					svm_binary_svc_probability(&sub_prob,param,weighted_C[i],weighted_C[j],probA[p],probB[p]);
-
-				f[p] = svm_train_one(&sub_prob,param,weighted_C[i],weighted_C[j]);
-				for(k=0;k<ci;k++)
-					if(!nonzero[si+k] && fabs(f[p].alpha[k]) > 0)
-						nonzero[si+k] = true;
-				for(k=0;k<cj;k++)
-					if(!nonzero[sj+k] && fabs(f[p].alpha[ci+k]) > 0)
-						nonzero[sj+k] = true;
-				free(sub_prob.x);
-				free(sub_prob.y);
+				pair_i[p] = i;
+				pair_j[p] = j;
+				order[p].size = count[i]+count[j];
+				order[p].index = p;
 				++p;
 			}
+		qsort(order,nr_pair,sizeof(pair_size),compare_pair_size);
+
+		// the shared kernel cache is not thread safe. If there are fewer
+		// pairs than threads, the threads go to the cross validation of
+		// probability estimates instead.
+		int nr_thread = min(param->nr_thread,nr_pair);
+		if(cache != NULL)
+			nr_thread = 1;
+#ifndef _OPENMP
+		nr_thread = 1;	// pairs run serially, so each can use the whole cache
+#endif
+		svm_parameter pair_param = *param;
+		if(nr_thread > 1)
+		{
+			pair_param.cache_size = split_cache_size(param,nr_thread);
+			pair_param.nr_thread = 1;
+		}
 
-		// build output
-
-		model->nr_class = nr_class;
-
-		model->label = Malloc(int,nr_class);
-		for(i=0;i<nr_class;i++)
-			model->label[i] = label[i];
-
-		model->rho = Malloc(double,nr_class*(nr_class-1)/2);
-		for(i=0;i<nr_class*(nr_class-1)/2;i++)
-			model->rho[i] = f[i].rho;
-
+		// the folds of probability estimates are drawn in the order of
+		// serial training so that probA and probB do not depend on nr_thread
+		int **prob_perm = NULL;
 		if(param->probability)
 		{
-			model->probA = Malloc(double,nr_class*(nr_class-1)/2);
-			model->probB = Malloc(double,nr_class*(nr_class-1)/2);
-			for(i=0;i<nr_class*(nr_class-1)/2;i++)
-			{
-				model->probA[i] = probA[i];
-				model->probB[i] = probB[i];
-			}
+			prob_perm = Malloc(int *,nr_pair);
+			for(p=0;p<nr_pair;p++)
+				prob_perm[p] = svm_binary_svc_probability_perm(count[pair_i[p]]+count[pair_j[p]]);
 		}
-		else
+
+		int t;
+#ifdef _OPENMP
+#pragma omp parallel for private(t) schedule(dynamic) num_threads(nr_thread) if(nr_thread > 1)
+#endif
+		for(t=0;t<nr_pair;t++)
+		{
+			int p = order[t].index;
+			int i = pair_i[p], j = pair_j[p];
+			svm_problem sub_prob;
+			int si = start[i], sj = start[j];
+			int ci = count[i], cj = count[j];
+			sub_prob.l = ci+cj;
+			sub_prob.x = Malloc(svm_node *,sub_prob.l);
+			sub_prob.y = Malloc(double,sub_prob.l);
+			int k;
+			for(k=0;k<ci;k++)
+			{
+				sub_prob.x[k] = x[si+k];
+				sub_prob.y[k] = +1;
+			}
+			for(k=0;k<cj;k++)
+			{
+				sub_prob.x[ci+k] = x[sj+k];
+				sub_prob.y[ci+k] = -1;
+			}
+
+			if(param->probability)
+			{
+				svm_binary_svc_probability(&sub_prob,&pair_param,weighted_C[i],weighted_C[j],probA[p],probB[p],cache,prob_perm[p]);
+				free(prob_perm[p]);
+			}
+
+			double *sub_init_coef = NULL;
+			if(init_model)
+			{
+				int mi, mj;
+				for(mi=0;mi<init_model->nr_class;mi++)
+					if(init_model->label[mi] == label[i])
+						break;
+				for(mj=0;mj<init_model->nr_class;mj++)
+					if(init_model->label[mj] == label[j])
+						break;
+				if(mi < init_model->nr_class && mj < init_model->nr_class)
+				{
+					// see the layout of sv_coef below; the signs are
+					// flipped if class i comes after class j in init_model
+					double sign = (mi < mj)? 1 : -1;
+					const double *coef_i = init_model->sv_coef[(mj > mi)? mj-1 : mj];
+					const double *coef_j = init_model->sv_coef[(mi > mj)? mi-1 : mi];
+					sub_init_coef = Malloc(double,sub_prob.l);
+					for(k=0;k<ci;k++)
+					{
+						int q = init_pos[perm[si+k]];
+						sub_init_coef[k] = (q >= init_start[mi] && q < init_start[mi+1])? sign*coef_i[q] : 0;
+					}
+					for(k=0;k<cj;k++)
+					{
+						int q = init_pos[perm[sj+k]];
+						sub_init_coef[ci+k] = (q >= init_start[mj] && q < init_start[mj+1])? sign*coef_j[q] : 0;
+					}
+				}
+			}
+
+			f[p] = svm_train_one(&sub_prob,&pair_param,weighted_C[i],weighted_C[j],cache,sub_init_coef,
+				init_model ? param->C/init_model->param.C : 1);
+			free(sub_init_coef);
+			free(sub_prob.x);
+			free(sub_prob.y);
+		}
+
+		for(p=0;p<nr_pair;p++)
+		{
+			int si = start[pair_i[p]], sj = start[pair_j[p]];
+			int ci = count[pair_i[p]], cj = count[pair_j[p]];
+			int k;
+			for(k=0;k<ci;k++)
+				if(!nonzero[si+k] && fabs(f[p].alpha[k]) > 0)
+					nonzero[si+k] = true;
+			for(k=0;k<cj;k++)
+				if(!nonzero[sj+k] && fabs(f[p].alpha[ci+k]) > 0)
+					nonzero[sj+k] = true;
+		}
+
+		// build output
+
+		model->nr_class = nr_class;
+
+		model->label = Malloc(int,nr_class);
+		for(i=0;i<nr_class;i++)
+			model->label[i] = label[i];
+
+		model->rho = Malloc(double,nr_class*(nr_class-1)/2);
+		for(i=0;i<nr_class*(nr_class-1)/2;i++)
+			model->rho[i] = f[i].rho;
+
+		if(stats)
+		{
+			*stats = Malloc(svm_solver_stats,nr_pair);
+			for(i=0;i<nr_pair;i++)
+				(*stats)[i] = f[i].stats;
+		}
+
+		if(param->probability)
+		{
+			model->probA = Malloc(double,nr_class*(nr_class-1)/2);
+			model->probB = Malloc(double,nr_class*(nr_class-1)/2);
+			for(i=0;i<nr_class*(nr_class-1)/2;i++)
+			{
+				model->probA[i] = probA[i];
+				model->probB[i] = probB[i];
+			}
+		}
+		else
 		{
 			model->probA=NULL;
 			model->probB=NULL;
@@ -2430,12 +3109,86 @@ svm_model *svm_train(const svm_problem *prob, const svm_parameter *param)
 		free(f);
 		free(nz_count);
 		free(nz_start);
+		free(init_pos);
+		free(init_start);
+		free(pair_i);
+		free(pair_j);
+		free(order);
+		free(prob_perm);
 	}
+	svm_compute_linear_weights(model);
+	svm_compute_sv_square(model);
 	return model;
 }
 
+// Train on the rows of old_prob followed by those of new_prob. The
+// solver starts from the solution of old_model (trained on old_prob);
+// the new rows start at alpha = 0.
+// the instances of old_prob followed by those of new_prob; free x and y
+static svm_problem concat_problems(const svm_problem *old_prob, const svm_problem *new_prob)
+{
+	svm_problem prob;
+	prob.l = old_prob->l + new_prob->l;
+	prob.x = Malloc(svm_node *,prob.l);
+	prob.y = Malloc(double,prob.l);
+	memcpy(prob.x,old_prob->x,sizeof(svm_node *)*old_prob->l);
+	memcpy(prob.x+old_prob->l,new_prob->x,sizeof(svm_node *)*new_prob->l);
+	memcpy(prob.y,old_prob->y,sizeof(double)*old_prob->l);
+	memcpy(prob.y+old_prob->l,new_prob->y,sizeof(double)*new_prob->l);
+	return prob;
+}
+
+const char *svm_check_parameter_incremental(const svm_problem *old_prob, const svm_problem *new_prob, const svm_parameter *param)
+{
+	svm_problem prob = concat_problems(old_prob,new_prob);
+	const char *error_msg = svm_check_parameter(&prob,param);
+	free(prob.x);
+	free(prob.y);
+	return error_msg;
+}
+
+svm_model *svm_train_incremental(const svm_problem *old_prob, const svm_problem *new_prob, const svm_parameter *param, const svm_model *old_model)
+{
+	svm_problem prob = concat_problems(old_prob,new_prob);
+
+	if(svm_check_parameter(&prob,param) != NULL)
+	{
+		free(prob.x);
+		free(prob.y);
+		return NULL;
+	}
+
+	// sv_indices of old_model must refer to old_prob
+	if(old_model != NULL && old_model->sv_indices != NULL)
+		for(int i=0;i<old_model->l;i++)
+			if(old_model->sv_indices[i] > old_prob->l)
+			{
+				old_model = NULL;
+				break;
+			}
+
+	svm_model *model = svm_train_warm_start(&prob,param,old_model,NULL);
+	free(prob.x);
+	free(prob.y);
+	return model;
+}
+
+void svm_free_solver_stats(svm_solver_stats **stats_ptr)
+{
+	if(stats_ptr != NULL && *stats_ptr != NULL)
+	{
+		free(*stats_ptr);
+		*stats_ptr = NULL;
+	}
+}
+
 // Stratified cross validation
 void svm_cross_validation(const svm_problem *prob, const svm_parameter *param, int nr_fold, double *target)
+{
+	svm_cross_validation_with_cache(prob,param,nr_fold,target,NULL);
+}
+
+void svm_cross_validation_with_cache(const svm_problem *prob, const svm_parameter *param, int nr_fold, double *target, svm_kernel_cache *cache)
 {
 	int i;
 	int *fold_start;
@@ -2511,6 +3264,26 @@ void svm_cross_validation(const svm_problem *prob, const svm_parameter *param, i
 			fold_start[i]=i*l/nr_fold;
 	}
 
+	// Folds are trained by up to nr_thread threads, each with an equal
+	// share of the cache. The kernel cache and the random numbers used in
+	// probability training cannot be shared by threads, so these cases
+	// run serially.
+	int nr_thread = min(param->nr_thread,nr_fold);
+	if(cache != NULL || param->probability)
+		nr_thread = 1;
+#ifndef _OPENMP
+	nr_thread = 1;	// folds run serially, so each can use the whole cache
+#endif
+	svm_parameter fold_param = *param;
+	if(nr_thread > 1)
+	{
+		fold_param.cache_size = split_cache_size(param,nr_thread);
+		fold_param.nr_thread = 1;
+	}
+
+#ifdef _OPENMP
+#pragma omp parallel for private(i) schedule(dynamic) num_threads(nr_thread) if(nr_thread > 1)
+#endif
 	for(i=0;i<nr_fold;i++)
 	{
 		int begin = fold_start[i];
@@ -2535,7 +3308,8 @@ void svm_cross_validation(const svm_problem *prob, const svm_parameter *param, i
 			subprob.y[k] = prob->y[perm[j]];
 			++k;
 		}
-		struct svm_model *submodel = svm_train(&subprob,param);
+		struct svm_model *submodel = svm_train_with_cache(&subprob,&fold_param,cache);
+		drop_prediction_shortcuts(submodel);
 		if(param->probability &&
 		   (param->svm_type == C_SVC || param->svm_type == NU_SVC))
 		{
@@ -2555,6 +3329,36 @@ void svm_cross_validation(const svm_problem *prob, const svm_parameter *param, i
 	free(perm);
 }
 
+svm_kernel_cache *svm_create_kernel_cache(const svm_problem *prob, const svm_parameter *param)
+{
+	svm_kernel_cache *cache = Malloc(svm_kernel_cache,1);
+	cache->l = prob->l;
+	cache->x_index = Malloc(svm_kernel_cache::node_index,prob->l);
+	for(int i=0;i<prob->l;i++)
+	{
+		cache->x_index[i].x = prob->x[i];
+		cache->x_index[i].index = i;
+	}
+	qsort(cache->x_index,prob->l,sizeof(svm_kernel_cache::node_index),compare_node_index);
+	cache->kernel_type = param->kernel_type;
+	cache->degree = param->degree;
+	cache->gamma = param->gamma;
+	cache->coef0 = param->coef0;
+	cache->size = kernel_cache_size(param,prob->l);
+	cache->cache = new Cache(prob->l,(size_t)(cache->size*(1<<20)));
+	return cache;
+}
+
+void svm_free_and_destroy_kernel_cache(svm_kernel_cache **cache_ptr_ptr)
+{
+	if(cache_ptr_ptr != NULL && *cache_ptr_ptr != NULL)
+	{
+		delete (*cache_ptr_ptr)->cache;
+		free((*cache_ptr_ptr)->x_index);
+		free(*cache_ptr_ptr);
+		*cache_ptr_ptr = NULL;
+	}
+}
 
 int svm_get_svm_type(const svm_model *model)
 {
@@ -2597,20 +3401,154 @@ double svm_get_svr_probability(const svm_model *model)
 	}
 }
 
+//
+// Inverted index of SVs for prediction
+//
+// The SVs are stored by feature (a column-major copy of the SV matrix):
+// the postings of feature k are (sv[t],value[t]) for t in
+// [start[k],start[k+1]). x^T SV_i of all SVs are accumulated by walking
+// the postings of the nonzeros of x only.
+//
+struct svm_inverted_index
+{
+	int nr_feature;		// max feature index + 1
+	size_t *start;
+	int *sv;
+	double *value;
+};
+
+int svm_build_inverted_index(svm_model *model)
+{
+	if(model->param.kernel_type == PRECOMPUTED || model->l <= 0)
+		return -1;
+	if(model->inverted_index != NULL)
+		return 0;
+
+	int l = model->l;
+	int i, nr_feature = 0;
+	for(i=0;i<l;i++)
+		for(const svm_node *px=model->SV[i];px->index!=-1;px++)
+		{
+			if(px->index < 0)
+				return -1;
+			nr_feature = max(nr_feature,px->index+1);
+		}
+
+	svm_inverted_index *index = Malloc(svm_inverted_index,1);
+	index->nr_feature = nr_feature;
+	index->start = Malloc(size_t,nr_feature+1);
+	for(i=0;i<=nr_feature;i++)
+		index->start[i] = 0;
+	for(i=0;i<l;i++)
+		for(const svm_node *px=model->SV[i];px->index!=-1;px++)
+			++index->start[px->index+1];
+	for(i=0;i<nr_feature;i++)
+		index->start[i+1] += index->start[i];
+
+	size_t nnz = index->start[nr_feature];
+	size_t *pos = Malloc(size_t,nr_feature);
+	memcpy(pos,index->start,sizeof(size_t)*nr_feature);
+	index->sv = Malloc(int,nnz);
+	index->value = Malloc(double,nnz);
+	for(i=0;i<l;i++)
+		for(const svm_node *px=model->SV[i];px->index!=-1;px++)
+		{
+			size_t t = pos[px->index]++;
+			index->sv[t] = i;
+			index->value[t] = px->value;
+		}
+	free(pos);
+
+	// the RBF kernel uses the SV norms of the model
+	if(model->param.kernel_type == RBF && model->sv_square == NULL)
+		svm_compute_sv_square(model);
+
+	model->inverted_index = index;
+	return 0;
+}
+
+static void free_inverted_index(svm_inverted_index *index)
+{
+	if(index == NULL)
+		return;
+	free(index->start);
+	free(index->sv);
+	free(index->value);
+	free(index);
+}
+
+// kernel values between x and all SVs by the inverted index
+static void inverted_index_kernel(const svm_model *model, const svm_node *x, double x_square, double *kvalue)
+{
+	const svm_inverted_index *index = model->inverted_index;
+	const svm_parameter& param = model->param;
+	int i, l = model->l;
+	for(i=0;i<l;i++)
+		kvalue[i] = 0;
+
+	for(;x->index!=-1;x++)
+	{
+		if(x->index < 0 || x->index >= index->nr_feature)
+			continue;
+		double v = x->value;
+		for(size_t t=index->start[x->index];t<index->start[x->index+1];t++)
+			kvalue[index->sv[t]] += v*index->value[t];
+	}
+
+	switch(param.kernel_type)
+	{
+		case POLY:
+			for(i=0;i<l;i++)
+				kvalue[i] = powi(param.gamma*kvalue[i]+param.coef0,param.degree);
+			break;
+		case RBF:
+			for(i=0;i<l;i++)
+				kvalue[i] = exp(-param.gamma*(x_square+model->sv_square[i]-2*kvalue[i]));
+			break;
+		case SIGMOID:
+			for(i=0;i<l;i++)
+				kvalue[i] = tanh(param.gamma*kvalue[i]+param.coef0);
+			break;
+	}
+}
+
+// K(x,SV_i), using the SV norms of the model if available
+static inline double model_kernel(const svm_model *model, const svm_node *x, double x_square, int i)
+{
+	if(model->sv_square != NULL)
+		return Kernel::k_function(x,model->SV[i],model->param,x_square,model->sv_square[i]);
+	return Kernel::k_function(x,model->SV[i],model->param);
+}
+
 double svm_predict_values(const svm_model *model, const svm_node *x, double* dec_values)
 {
 	int i;
+	// ||x||^2 for the RBF kernel with SV norms
+	double x_square = (model->sv_square != NULL) ? dot_self(x) : 0;
 	if(model->param.svm_type == ONE_CLASS ||
 	   model->param.svm_type == EPSILON_SVR ||
 	   model->param.svm_type == NU_SVR)
 	{
 		double *sv_coef = model->sv_coef[0];
 		double sum = 0;
+		if(model->w != NULL)
+			sum = dot_dense(x,model->w,model->w_dim);
+		else if(model->inverted_index != NULL)
+		{
+			double *kvalue = Malloc(double,model->l);
+			inverted_index_kernel(model,x,x_square,kvalue);
+			for(i=0;i<model->l;i++)
+				sum += sv_coef[i] * kvalue[i];
+			free(kvalue);
+		}
+		else
+		{
 #ifdef _OPENMP
 #pragma omp parallel for private(i) reduction(+:sum) schedule(guided)
 #endif
-		for(i=0;i<model->l;i++)
-			sum += sv_coef[i] * Kernel::k_function(x,model->SV[i],model->param);
+			for(i=0;i<model->l;i++)
+				sum += sv_coef[i] * model_kernel(model,x,x_square,i);
+		}
 		sum -= model->rho[0];
 		*dec_values = sum;
 
@@ -2619,17 +3557,49 @@ double svm_predict_values(const svm_model *model, const svm_node *x, double* dec
 		else
 			return sum;
 	}
+	else if(model->w != NULL)
+	{
+		int nr_class = model->nr_class;
+		int *vote = Malloc(int,nr_class);
+		for(i=0;i<nr_class;i++)
+			vote[i] = 0;
+
+		int p=0;
+		for(i=0;i<nr_class;i++)
+			for(int j=i+1;j<nr_class;j++)
+			{
+				dec_values[p] = dot_dense(x,&model->w[(size_t)p*model->w_dim],model->w_dim) - model->rho[p];
+				if(dec_values[p] > 0)
+					++vote[i];
+				else
+					++vote[j];
+				p++;
+			}
+
+		int vote_max_idx = 0;
+		for(i=1;i<nr_class;i++)
+			if(vote[i] > vote[vote_max_idx])
+				vote_max_idx = i;
+
+		free(vote);
+		return model->label[vote_max_idx];
+	}
 	else
 	{
 		int nr_class = model->nr_class;
 		int l = model->l;
 
 		double *kvalue = Malloc(double,l);
+		if(model->inverted_index != NULL)
+			inverted_index_kernel(model,x,x_square,kvalue);
+		else
+		{
 #ifdef _OPENMP
 #pragma omp parallel for private(i) schedule(guided)
 #endif
-		for(i=0;i<l;i++)
-			kvalue[i] = Kernel::k_function(x,model->SV[i],model->param);
+			for(i=0;i<l;i++)
+				kvalue[i] = model_kernel(model,x,x_square,i);
+		}
 
 		int *start = Malloc(int,nr_class);
 		start[0] = 0;
@@ -2679,6 +3649,79 @@ double svm_predict_values(const svm_model *model, const svm_node *x, double* dec
 	}
 }
 
+// Predict by a decision DAG: the candidates are classes first,...,last;
+// the function of (first,last) removes one of them, so k-1 functions are
+// evaluated instead of k(k-1)/2. Every class is compared once before it is
+// removed, so the kernel values of all SVs are still needed.
+double svm_predict_values_dag(const svm_model *model, const svm_node *x, double* dec_values)
+{
+	int svm_type = model->param.svm_type;
+	int nr_class = model->nr_class;
+	if((svm_type != C_SVC && svm_type != NU_SVC) || nr_class <= 2)
+		return svm_predict_values(model, x, dec_values);
+
+	int i, k;
+	int l = model->l;
+	int nr_pair = nr_class*(nr_class-1)/2;
+	for(i=0;i<nr_pair;i++)
+		dec_values[i] = 0;
+
+	int *start = Malloc(int,nr_class);
+	start[0] = 0;
+	for(i=1;i<nr_class;i++)
+		start[i] = start[i-1]+model->nSV[i-1];
+
+	double *kvalue = NULL;
+	if(model->w == NULL)
+	{
+		double x_square = (model->sv_square != NULL) ? dot_self(x) : 0;
+		kvalue = Malloc(double,l);
+		if(model->inverted_index != NULL)
+			inverted_index_kernel(model,x,x_square,kvalue);
+		else
+		{
+#ifdef _OPENMP
+#pragma omp parallel for private(k) schedule(guided)
+#endif
+			for(k=0;k<l;k++)
+				kvalue[k] = model_kernel(model,x,x_square,k);
+		}
+	}
+
+	int first = 0, last = nr_class-1;
+	while(first < last)
+	{
+		i = first;
+		int j = last;
+		int p = i*(2*nr_class-i-1)/2+j-i-1;	// index of (i,j) in rho
+		double sum;
+		if(model->w != NULL)
+			sum = dot_dense(x,&model->w[(size_t)p*model->w_dim],model->w_dim);
+		else
+		{
+			// see svm_predict_values for the layout of sv_coef
+			sum = 0;
+			double *coef1 = model->sv_coef[j-1];
+			double *coef2 = model->sv_coef[i];
+			for(k=start[i];k<start[i]+model->nSV[i];k++)
+				sum += coef1[k] * kvalue[k];
+			for(k=start[j];k<start[j]+model->nSV[j];k++)
+				sum += coef2[k] * kvalue[k];
+		}
+		sum -= model->rho[p];
+		dec_values[p] = sum;
+
+		if(sum > 0)
+			--last;
+		else
+			++first;
+	}
+
+	free(start);
+	free(kvalue);
+	return model->label[first];
+}
+
 double svm_predict(const svm_model *model, const svm_node *x)
 {
 	int nr_class = model->nr_class;
@@ -2747,6 +3790,69 @@ double svm_predict_probability(
 		return svm_predict(model, x);
 }
 
+void svm_predict_batch(const svm_model *model, const svm_problem *prob, int predict_probability, double *target, double *values)
+{
+	int i;
+	int svm_type = model->param.svm_type;
+	int nr_class = model->nr_class;
+	int nr_value;
+
+	// number of values stored for each instance
+	if(predict_probability && svm_check_probability_model(model))
+	{
+		if(svm_type == C_SVC || svm_type == NU_SVC)
+			nr_value = nr_class;
+		else if(svm_type == ONE_CLASS)
+			nr_value = 2;
+		else
+			nr_value = 0;	// regression has no probability estimates
+	}
+	else
+	{
+		predict_probability = 0;
+		if(svm_type == ONE_CLASS ||
+		   svm_type == EPSILON_SVR ||
+		   svm_type == NU_SVR)
+			nr_value = 1;
+		else
+			nr_value = nr_class*(nr_class-1)/2;
+	}
+
+	double *buf = Malloc(double,max(nr_value,1));
+	for(i=0;i<prob->l;i++)
+	{
+		double *v = (values != NULL)? &values[(size_t)i*nr_value] : buf;
+		if(nr_value == 0)
+			v = buf;
+		if(predict_probability)
+			target[i] = svm_predict_probability(model,prob->x[i],v);
+		else
+			target[i] = svm_predict_values(model,prob->x[i],v);
+	}
+	free(buf);
+}
+
+void svm_predict_batch_dag(const svm_model *model, const svm_problem *prob, double *target, double *values)
+{
+	int svm_type = model->param.svm_type;
+	int nr_class = model->nr_class;
+	int nr_value;
+	if(svm_type == ONE_CLASS ||
+	   svm_type == EPSILON_SVR ||
+	   svm_type == NU_SVR)
+		nr_value = 1;
+	else
+		nr_value = nr_class*(nr_class-1)/2;
+
+	double *buf = Malloc(double,max(nr_value,1));
+	for(int i=0;i<prob->l;i++)
+	{
+		double *v = (values != NULL)? &values[(size_t)i*nr_value] : buf;
+		target[i] = svm_predict_values_dag(model,prob->x[i],v);
+	}
+	free(buf);
+}
+
 static const char *svm_type_table[] =
 {
 	"c_svc","nu_svc","one_class","epsilon_svr","nu_svr",NULL
@@ -2862,6 +3968,227 @@ int svm_save_model(const char *model_file_name, const svm_model *model)
 	else return 0;
 }
 
+//
+// Binary model file:
+//
+// header (padded to BINARY_HEADER_SIZE bytes), SV nodes, sv_coef[0..nr_class-2][0..l-1],
+// offsets of SVs in the node block (int64_t[l]), rho, probA, probB,
+// prob_density_marks, sv_indices, label, nSV
+//
+// Numbers are stored in the native byte order. The node block follows the
+// header, so a model whose SVs point into the file image can find the
+// image from SV[0].
+//
+#define BINARY_HEADER_SIZE 128
+#define BINARY_HAS_LABEL 1
+#define BINARY_HAS_PROBA 2
+#define BINARY_HAS_PROBB 4
+#define BINARY_HAS_PROB_DENSITY_MARKS 8
+#define BINARY_HAS_NSV 16
+#define BINARY_HAS_SV_INDICES 32
+static const char binary_model_magic[8] = {'L','I','B','S','V','M','B','M'};
+
+struct binary_model_header
+{
+	char magic[8];
+	int version;
+	int svm_type;
+	int kernel_type;
+	int degree;
+	double gamma;
+	double coef0;
+	int nr_class;
+	int l;
+	int flags;
+	int reserved;
+	int64_t nr_node;
+	int64_t file_size;
+};
+
+struct binary_model_layout
+{
+	size_t coef, sv_offset, rho, probA, probB, prob_density_marks, sv_indices, label, nSV, end;
+};
+
+static void get_binary_model_layout(const binary_model_header& h, binary_model_layout& o)
+{
+	size_t m = (size_t)(h.nr_class-1), l = (size_t)h.l;
+	size_t nr_pair = (size_t)(h.nr_class*(h.nr_class-1)/2);
+	o.coef = BINARY_HEADER_SIZE + (size_t)h.nr_node*sizeof(svm_node);
+	o.sv_offset = o.coef + m*l*sizeof(double);
+	o.rho = o.sv_offset + l*sizeof(int64_t);
+	o.probA = o.rho + nr_pair*sizeof(double);
+	o.probB = o.probA + ((h.flags & BINARY_HAS_PROBA) ? nr_pair*sizeof(double) : 0);
+	o.prob_density_marks = o.probB + ((h.flags & BINARY_HAS_PROBB) ? nr_pair*sizeof(double) : 0);
+	o.sv_indices = o.prob_density_marks + ((h.flags & BINARY_HAS_PROB_DENSITY_MARKS) ? 10*sizeof(double) : 0);
+	o.label = o.sv_indices + ((h.flags & BINARY_HAS_SV_INDICES) ? l*sizeof(int) : 0);
+	o.nSV = o.label + ((h.flags & BINARY_HAS_LABEL) ? h.nr_class*sizeof(int) : 0);
+	o.end = o.nSV + ((h.flags & BINARY_HAS_NSV) ? h.nr_class*sizeof(int) : 0);
+}
+
+// writes to a file, or to a buffer of the given size; pos counts all bytes
+struct binary_writer
+{
+	FILE *fp;
+	char *buf;
+	size_t size;
+	size_t pos;
+};
+
+static void binary_write(binary_writer& w, const void *ptr, size_t n)
+{
+	if(w.fp != NULL)
+		fwrite(ptr,1,n,w.fp);
+	else if(w.buf != NULL && w.pos+n <= w.size)
+		memcpy(w.buf+w.pos,ptr,n);
+	w.pos += n;
+}
+
+static void write_model_binary(binary_writer& w, const svm_model *model)
+{
+	const svm_parameter& param = model->param;
+	int nr_class = model->nr_class;
+	int l = model->l;
+	int nr_pair = nr_class*(nr_class-1)/2;
+	int i;
+
+	// only 0:sample_serial_number is kept for precomputed kernel
+	int64_t *sv_offset = Malloc(int64_t,l);
+	int64_t nr_node = 0;
+	for(i=0;i<l;i++)
+	{
+		sv_offset[i] = nr_node;
+		if(param.kernel_type == PRECOMPUTED)
+			nr_node += 2;
+		else
+		{
+			const svm_node *p = model->SV[i];
+			while(p->index != -1)
+				p++;
+			nr_node += p - model->SV[i] + 1;
+		}
+	}
+
+	binary_model_header h;
+	memset(&h,0,sizeof(h));
+	memcpy(h.magic,binary_model_magic,sizeof(h.magic));
+	h.version = 1;
+	h.svm_type = param.svm_type;
+	h.kernel_type = param.kernel_type;
+	h.degree = param.degree;
+	h.gamma = param.gamma;
+	h.coef0 = param.coef0;
+	h.nr_class = nr_class;
+	h.l = l;
+	h.flags = (model->label ? BINARY_HAS_LABEL : 0) |
+		(model->probA ? BINARY_HAS_PROBA : 0) |
+		(model->probB ? BINARY_HAS_PROBB : 0) |
+		(model->prob_density_marks ? BINARY_HAS_PROB_DENSITY_MARKS : 0) |
+		(model->nSV ? BINARY_HAS_NSV : 0) |
+		(model->sv_indices ? BINARY_HAS_SV_INDICES : 0);
+	h.nr_node = nr_node;
+	binary_model_layout o;
+	get_binary_model_layout(h,o);
+	h.file_size = (int64_t)o.end;
+
+	char pad[BINARY_HEADER_SIZE];
+	memset(pad,0,sizeof(pad));
+	binary_write(w,&h,sizeof(h));
+	binary_write(w,pad,BINARY_HEADER_SIZE-sizeof(h));
+
+	// write nodes one by one so that the padding bytes are zeros
+	svm_node node;
+	memset(&node,0,sizeof(node));
+	for(i=0;i<l;i++)
+	{
+		const svm_node *p = model->SV[i];
+		if(param.kernel_type == PRECOMPUTED)
+		{
+			node.index = 0;
+			node.value = p->value;
+			binary_write(w,&node,sizeof(node));
+		}
+		else
+			for(;p->index != -1;p++)
+			{
+				node.index = p->index;
+				node.value = p->value;
+				binary_write(w,&node,sizeof(node));
+			}
+		node.index = -1;
+		node.value = 0;
+		binary_write(w,&node,sizeof(node));
+	}
+
+	for(i=0;i<nr_class-1;i++)
+		binary_write(w,model->sv_coef[i],l*sizeof(double));
+	binary_write(w,sv_offset,l*sizeof(int64_t));
+	binary_write(w,model->rho,nr_pair*sizeof(double));
+	if(model->probA)
+		binary_write(w,model->probA,nr_pair*sizeof(double));
+	if(model->probB)
+		binary_write(w,model->probB,nr_pair*sizeof(double));
+	if(model->prob_density_marks)
+		binary_write(w,model->prob_density_marks,10*sizeof(double));
+	if(model->sv_indices)
+		binary_write(w,model->sv_indices,l*sizeof(int));
+	if(model->label)
+		binary_write(w,model->label,nr_class*sizeof(int));
+	if(model->nSV)
+		binary_write(w,model->nSV,nr_class*sizeof(int));
+	free(sv_offset);
+}
+
+int svm_save_model_binary(const char *model_file_name, const svm_model *model)
+{
+#ifndef _WIN32
+	// Models loaded by svm_load_model_binary map the file, so it is not
+	// rewritten in place (their pages would go away). The model is written
+	// to a temporary file, which then replaces the old one by rename.
+	char *tmp_name = Malloc(char,strlen(model_file_name)+32);
+	sprintf(tmp_name,"%s.%ld.tmp",model_file_name,(long)getpid());
+	int fd = open(tmp_name,O_WRONLY|O_CREAT|O_TRUNC,0666);
+	FILE *fp = (fd == -1) ? NULL : fdopen(fd,"wb");
+	if(fp==NULL)
+	{
+		if(fd != -1)
+		{
+			close(fd);
+			unlink(tmp_name);
+		}
+		free(tmp_name);
+		return -1;
+	}
+#else
+	FILE *fp = fopen(model_file_name,"wb");
+	if(fp==NULL) return -1;
+#endif
+
+	binary_writer w = {fp, NULL, 0, 0};
+	write_model_binary(w,model);
+
+	int ret = 0;
+	if (ferror(fp) != 0)
+		ret = -1;
+	if (fclose(fp) != 0)
+		ret = -1;
+#ifndef _WIN32
+	if (ret == 0 && rename(tmp_name,model_file_name) != 0)
+		ret = -1;
+	if (ret != 0)
+		unlink(tmp_name);
+	free(tmp_name);
+#endif
+	return ret;
+}
+
+size_t svm_save_model_buffer(const svm_model *model, char *buf, size_t size)
+{
+	binary_writer w = {NULL, buf, size, 0};
+	write_model_binary(w,model);
+	return w.pos;
+}
+
 static char *line = NULL;
 static int max_line_len;
 
@@ -3017,6 +4344,15 @@ svm_model *svm_load_model(const char *model_file_name)
 	FILE *fp = fopen(model_file_name,"rb");
 	if(fp==NULL) return NULL;
 
+	char magic[sizeof(binary_model_magic)];
+	if(fread(magic,1,sizeof(magic),fp) == sizeof(magic) &&
+	   memcmp(magic,binary_model_magic,sizeof(magic)) == 0)
+	{
+		fclose(fp);
+		return svm_load_model_binary(model_file_name);
+	}
+	rewind(fp);
+
 	char *old_locale = setlocale(LC_ALL, NULL);
 	if (old_locale) {
 		old_locale = strdup(old_locale);
@@ -3033,6 +4369,7 @@ svm_model *svm_load_model(const char *model_file_name)
 	model->sv_indices = NULL;
 	model->label = NULL;
 	model->nSV = NULL;
+	model->inverted_index = NULL;
 
 	// read header
 	if (!read_model_header(fp, model))
@@ -3118,14 +4455,341 @@ svm_model *svm_load_model(const char *model_file_name)
 		return NULL;
 
 	model->free_sv = 1;	// XXX
+	model->image_size = 0;
+	svm_compute_linear_weights(model);
+	svm_compute_sv_square(model);
+	return model;
+}
+
+// Build a model from image, a binary model file of the given size held in
+// memory. SV and sv_coef point into image, which is released according to
+// free_sv (2: munmap, 3: free) by svm_free_model_content. If NULL is
+// returned or the model has no SV, image is not used and the caller
+// releases it.
+static svm_model *model_from_binary_image(char *image, size_t size, int free_sv)
+{
+	binary_model_header h;
+	if(size < BINARY_HEADER_SIZE)
+		return NULL;
+	memcpy(&h,image,sizeof(h));
+	if(memcmp(h.magic,binary_model_magic,sizeof(h.magic)) != 0 ||
+	   h.version != 1 || h.nr_class < 1 || h.l < 0 || h.nr_node < 0 ||
+	   h.svm_type < C_SVC || h.svm_type > NU_SVR ||
+	   h.kernel_type < LINEAR || h.kernel_type > PRECOMPUTED ||
+	   (h.l > 0 && h.nr_node == 0))
+		return NULL;
+	binary_model_layout o;
+	get_binary_model_layout(h,o);
+	if((int64_t)o.end != h.file_size || o.end != size)
+		return NULL;
+
+	int nr_class = h.nr_class;
+	int l = h.l;
+	int m = nr_class-1;
+	int nr_pair = nr_class*(nr_class-1)/2;
+	int i;
+
+	// SVs are consecutive runs of nodes with increasing indices, each
+	// ended by index -1, as svm_save_model_binary writes them
+	svm_node *x_space = (svm_node *)(image + BINARY_HEADER_SIZE);
+	int64_t next = 0;
+	for(i=0;i<l;i++)
+	{
+		int64_t offset;
+		memcpy(&offset,image+o.sv_offset+i*sizeof(int64_t),sizeof(offset));
+		if(offset != next)
+			return NULL;
+		int64_t j = offset;
+		for(;j<h.nr_node && x_space[j].index != -1;j++)
+			if(j > offset && x_space[j].index <= x_space[j-1].index)
+				return NULL;
+		if(j == h.nr_node)
+			return NULL;
+		next = j+1;
+	}
+	if(next != h.nr_node)
+		return NULL;
+
+	svm_model *model = Malloc(svm_model,1);
+	model->inverted_index = NULL;
+	svm_parameter& param = model->param;
+	memset(&param,0,sizeof(param));
+	param.svm_type = h.svm_type;
+	param.kernel_type = h.kernel_type;
+	param.degree = h.degree;
+	param.gamma = h.gamma;
+	param.coef0 = h.coef0;
+	param.nr_weight = 0;
+	param.weight_label = NULL;
+	param.weight = NULL;
+	model->nr_class = nr_class;
+	model->l = l;
+
+	model->SV = Malloc(svm_node*,l);
+	for(i=0;i<l;i++)
+	{
+		int64_t offset;
+		memcpy(&offset,image+o.sv_offset+i*sizeof(int64_t),sizeof(offset));
+		model->SV[i] = &x_space[offset];
+	}
+	model->sv_coef = Malloc(double *,m);
+	for(i=0;i<m;i++)
+		model->sv_coef[i] = (l > 0) ? (double *)(image+o.coef) + (size_t)i*l : NULL;
+
+	// small arrays are copied so that they are freed as usual
+	model->rho = Malloc(double,nr_pair);
+	memcpy(model->rho,image+o.rho,nr_pair*sizeof(double));
+	model->probA = NULL;
+	if(h.flags & BINARY_HAS_PROBA)
+	{
+		model->probA = Malloc(double,nr_pair);
+		memcpy(model->probA,image+o.probA,nr_pair*sizeof(double));
+	}
+	model->probB = NULL;
+	if(h.flags & BINARY_HAS_PROBB)
+	{
+		model->probB = Malloc(double,nr_pair);
+		memcpy(model->probB,image+o.probB,nr_pair*sizeof(double));
+	}
+	model->prob_density_marks = NULL;
+	if(h.flags & BINARY_HAS_PROB_DENSITY_MARKS)
+	{
+		model->prob_density_marks = Malloc(double,10);
+		memcpy(model->prob_density_marks,image+o.prob_density_marks,10*sizeof(double));
+	}
+	model->sv_indices = NULL;
+	if(h.flags & BINARY_HAS_SV_INDICES)
+	{
+		model->sv_indices = Malloc(int,l);
+		memcpy(model->sv_indices,image+o.sv_indices,l*sizeof(int));
+	}
+	model->label = NULL;
+	if(h.flags & BINARY_HAS_LABEL)
+	{
+		model->label = Malloc(int,nr_class);
+		memcpy(model->label,image+o.label,nr_class*sizeof(int));
+	}
+	model->nSV = NULL;
+	if(h.flags & BINARY_HAS_NSV)
+	{
+		model->nSV = Malloc(int,nr_class);
+		memcpy(model->nSV,image+o.nSV,nr_class*sizeof(int));
+	}
+
+	// with no SV, nothing points into image
+	model->free_sv = (l > 0) ? free_sv : 1;
+	model->image_size = (l > 0) ? size : 0;
+	svm_compute_linear_weights(model);
+	svm_compute_sv_square(model);
 	return model;
 }
 
+svm_model *svm_load_model_binary(const char *model_file_name)
+{
+	FILE *fp = fopen(model_file_name,"rb");
+	if(fp==NULL) return NULL;
+
+	long size = -1;
+	if(fseek(fp,0,SEEK_END) == 0)
+		size = ftell(fp);
+	if(size < BINARY_HEADER_SIZE)
+	{
+		fclose(fp);
+		return NULL;
+	}
+
+	svm_model *model = NULL;
+#ifndef _WIN32
+	// SV nodes and sv_coef are used in place from a shared read-only
+	// mapping, so processes loading the same file share memory
+	void *base = mmap(NULL,(size_t)size,PROT_READ,MAP_SHARED,fileno(fp),0);
+	if(base != MAP_FAILED)
+	{
+		model = model_from_binary_image((char *)base,(size_t)size,2);
+		if(model == NULL || model->l == 0)
+			munmap(base,(size_t)size);
+		fclose(fp);
+		return model;
+	}
+#endif
+	char *image = Malloc(char,size);
+	rewind(fp);
+	if(fread(image,1,(size_t)size,fp) == (size_t)size)
+		model = model_from_binary_image(image,(size_t)size,3);
+	if(model == NULL || model->l == 0)
+		free(image);
+	fclose(fp);
+	return model;
+}
+
+svm_model *svm_load_model_buffer(const char *buf, size_t size)
+{
+	if(size < BINARY_HEADER_SIZE)
+		return NULL;
+	char *image = Malloc(char,size);
+	memcpy(image,buf,size);
+	svm_model *model = model_from_binary_image(image,size,3);
+	if(model == NULL || model->l == 0)
+		free(image);
+	return model;
+}
+
+//
+// Parse LIBSVM-format data held in memory
+//
+static inline bool is_blank(char c)
+{
+	return c == ' ' || c == '\t' || c == '\r' || c == '\v' || c == '\f';
+}
+
+// token [s,e) is not null-terminated, so copy it before calling strtod/strtol
+static bool parse_double(const char *s, const char *e, double *v)
+{
+	char tmp[64], *t = tmp, *endptr;
+	size_t n = (size_t)(e-s);
+	if(n == 0)
+		return false;
+	if(n >= sizeof(tmp))
+		t = Malloc(char,n+1);
+	memcpy(t,s,n);
+	t[n] = '\0';
+	*v = strtod(t,&endptr);
+	bool ok = (endptr == t+n);
+	if(t != tmp)
+		free(t);
+	return ok;
+}
+
+static bool parse_index(const char *s, const char *e, int *v)
+{
+	char tmp[32], *endptr;
+	size_t n = (size_t)(e-s);
+	if(n == 0 || n >= sizeof(tmp))
+		return false;
+	memcpy(tmp,s,n);
+	tmp[n] = '\0';
+	errno = 0;
+	long r = strtol(tmp,&endptr,10);
+	if(endptr != tmp+n || errno != 0 || r < 0 || r > INT_MAX)
+		return false;
+	*v = (int)r;
+	return true;
+}
+
+int svm_parse_problem(const char *buf, size_t len, double *y, size_t *rowptr, int *index, double *value, int *l, size_t *nnz)
+{
+	const char *p = buf, *end = buf+len;
+	char *old_locale = NULL;
+	int i = 0, ret = 0;
+	size_t j = 0;
+
+	if(y != NULL)
+	{
+		old_locale = setlocale(LC_ALL, NULL);
+		if (old_locale) {
+			old_locale = strdup(old_locale);
+		}
+		setlocale(LC_ALL, "C");
+	}
+
+	while(p < end)
+	{
+		const char *eol = (const char *)memchr(p,'\n',(size_t)(end-p));
+		if(eol == NULL)
+			eol = end;
+
+		// label
+		const char *s = p, *t;
+		while(s < eol && is_blank(*s))
+			++s;
+		t = s;
+		while(t < eol && !is_blank(*t))
+			++t;
+		if(s == t) // empty line
+		{
+			ret = i+1;
+			break;
+		}
+		if(y != NULL)
+		{
+			rowptr[i] = j;
+			if(!parse_double(s,t,&y[i]))
+			{
+				ret = i+1;
+				break;
+			}
+		}
+
+		// features
+		while(1)
+		{
+			s = t;
+			while(s < eol && is_blank(*s))
+				++s;
+			if(s == eol)
+				break;
+			const char *colon = NULL;
+			t = s;
+			while(t < eol && !is_blank(*t))
+			{
+				if(*t == ':')
+				{
+					if(colon != NULL)
+						break;
+					colon = t;
+				}
+				++t;
+			}
+			if(colon == NULL || (t < eol && !is_blank(*t)))
+			{
+				ret = i+1;
+				break;
+			}
+			if(y != NULL &&
+			   (!parse_index(s,colon,&index[j]) || !parse_double(colon+1,t,&value[j])))
+			{
+				ret = i+1;
+				break;
+			}
+			++j;
+		}
+		if(ret != 0)
+			break;
+
+		++i;
+		p = eol+1;
+	}
+
+	if(y != NULL)
+	{
+		if(ret == 0)
+			rowptr[i] = j;
+		setlocale(LC_ALL, old_locale);
+		free(old_locale);
+	}
+	*l = i;
+	*nnz = j;
+	return ret;
+}
+
 void svm_free_model_content(svm_model* model_ptr)
 {
-	if(model_ptr->free_sv && model_ptr->l > 0 && model_ptr->SV != NULL)
+	if(model_ptr->free_sv >= 2 && model_ptr->l > 0 && model_ptr->SV != NULL)
+	{
+		// SV and sv_coef point into the image of a binary model file,
+		// which starts BINARY_HEADER_SIZE bytes before SV[0]
+		char *base = (char *)model_ptr->SV[0] - BINARY_HEADER_SIZE;
+#ifndef _WIN32
+		// the header may have changed if the file was rewritten
+		if(model_ptr->free_sv == 2)
+			munmap(base,model_ptr->image_size);
+		else
+#endif
+			free(base);
+	}
+	else if(model_ptr->free_sv && model_ptr->l > 0 && model_ptr->SV != NULL)
 		free((void *)(model_ptr->SV[0]));
-	if(model_ptr->sv_coef)
+	if(model_ptr->sv_coef && model_ptr->free_sv < 2)
 	{
 		for(int i=0;i<model_ptr->nr_class-1;i++)
 			free(model_ptr->sv_coef[i]);
@@ -3157,6 +4821,16 @@ void svm_free_model_content(svm_model* model_ptr)
 
 	free(model_ptr->nSV);
 	model_ptr->nSV = NULL;
+
+	free(model_ptr->w);
+	model_ptr->w = NULL;
+	model_ptr->w_dim = 0;
+
+	free(model_ptr->sv_square);
+	model_ptr->sv_square = NULL;
+
+	free_inverted_index(model_ptr->inverted_index);
+	model_ptr->inverted_index = NULL;
 }
 
 void svm_free_and_destroy_model(svm_model** model_ptr_ptr)
@@ -3206,7 +4880,12 @@ const char *svm_check_parameter(const svm_problem *prob, const svm_parameter *pa
 
 	// cache_size,eps,C,nu,p,shrinking
 
-	if(param->cache_size <= 0)
+	if(param->auto_cache)
+	{
+		if(param->cache_size < 0)
+			return "cache_size < 0";
+	}
+	else if(param->cache_size <= 0)
 		return "cache_size <= 0";
 
 	if(param->eps <= 0)
@@ -3236,6 +4915,9 @@ const char *svm_check_parameter(const svm_problem *prob, const svm_parameter *pa
 	   param->probability != 1)
 		return "probability != 0 and probability != 1";
 
+	if(param->nr_thread <= 0)
+		return "nr_thread <= 0";
+
 
 	// check whether nu-svc is feasible
 
@@ -3303,6 +4985,23 @@ int svm_check_probability_model(const svm_model *model)
 		 model->probA!=NULL);
 }
 
+int svm_set_num_threads(int nr_thread)
+{
+#ifdef _OPENMP
+	int old_nr_thread = omp_get_max_threads();
+	if(nr_thread > 0)
+		omp_set_num_threads(nr_thread);
+	return old_nr_thread;
+#else
+	return 1;
+#endif
+}
+
+void svm_set_random_seed(unsigned int seed)
+{
+	srand(seed);
+}
+
 void svm_set_print_string_function(void (*print_func)(const char *))
 {
 	if(print_func == NULL)
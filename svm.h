@@ -1,7 +1,9 @@
 #ifndef _LIBSVM_H
 #define _LIBSVM_H
 
-#define LIBSVM_VERSION 337
+#include <stddef.h>
+
+#define LIBSVM_VERSION 338
 
 #ifdef __cplusplus
 extern "C" {
@@ -44,8 +46,12 @@ struct svm_parameter
 	double p;	/* for EPSILON_SVR */
 	int shrinking;	/* use the shrinking heuristics */
 	int probability; /* do probability estimates */
+	int nr_thread;	/* number of threads for parallel training */
+	int auto_cache;	/* choose cache_size automatically, at most cache_size MB if cache_size > 0 */
 };
 
+struct svm_inverted_index;
+
 //
 // svm_model
 //
@@ -70,13 +76,51 @@ struct svm_model
 	/* XXX */
 	int free_sv;		/* 1 if svm_model is created by svm_load_model*/
 				/* 0 if svm_model is created by svm_train */
+				/* 2 if SV and sv_coef are mapped from a binary model file */
+				/* 3 if SV and sv_coef are in a copy of a binary model */
+	size_t image_size;	/* bytes of the binary model image if free_sv is 2 or 3 */
+
+	/* for linear kernel only */
+	double *w;		/* weight vectors of the decision functions (w[p*w_dim+k] for feature k of function p), NULL if not computed */
+	int w_dim;		/* number of features in w (max feature index of SVs + 1) */
+
+	/* for RBF kernel only */
+	double *sv_square;	/* squared norms of SVs (sv_square[l]), NULL if not computed */
+
+	struct svm_inverted_index *inverted_index;	/* built by svm_build_inverted_index, NULL if not built */
+};
+
+struct svm_solver_stats
+{
+	int iter;		/* number of iterations */
+	double time;		/* time of the solver in seconds */
+	long long nr_kernel_eval;	/* number of kernel evaluations */
+	long long nr_cache_hit;	/* kernel columns found in the cache */
+	long long nr_cache_miss;	/* kernel columns (partly) computed */
+	int nr_shrink;		/* shrinking steps that removed variables */
+	int nr_reconstruct;	/* reconstructions of the gradient */
+	int active_size;	/* size of the active set when the solver stopped */
 };
 
 struct svm_model *svm_train(const struct svm_problem *prob, const struct svm_parameter *param);
 void svm_cross_validation(const struct svm_problem *prob, const struct svm_parameter *param, int nr_fold, double *target);
 
+struct svm_kernel_cache;
+struct svm_kernel_cache *svm_create_kernel_cache(const struct svm_problem *prob, const struct svm_parameter *param);
+void svm_free_and_destroy_kernel_cache(struct svm_kernel_cache **cache_ptr_ptr);
+struct svm_model *svm_train_with_cache(const struct svm_problem *prob, const struct svm_parameter *param, struct svm_kernel_cache *cache);
+struct svm_model *svm_train_warm_start(const struct svm_problem *prob, const struct svm_parameter *param, const struct svm_model *init_model, struct svm_kernel_cache *cache);
+struct svm_model *svm_train_with_stats(const struct svm_problem *prob, const struct svm_parameter *param, const struct svm_model *init_model, struct svm_kernel_cache *cache, struct svm_solver_stats **stats);
+void svm_free_solver_stats(struct svm_solver_stats **stats_ptr);
+struct svm_model *svm_train_incremental(const struct svm_problem *old_prob, const struct svm_problem *new_prob, const struct svm_parameter *param, const struct svm_model *old_model);
+void svm_cross_validation_with_cache(const struct svm_problem *prob, const struct svm_parameter *param, int nr_fold, double *target, struct svm_kernel_cache *cache);
+
 int svm_save_model(const char *model_file_name, const struct svm_model *model);
 struct svm_model *svm_load_model(const char *model_file_name);
+int svm_save_model_binary(const char *model_file_name, const struct svm_model *model);
+struct svm_model *svm_load_model_binary(const char *model_file_name);
+size_t svm_save_model_buffer(const struct svm_model *model, char *buf, size_t size);
+struct svm_model *svm_load_model_buffer(const char *buf, size_t size);
 
 int svm_get_svm_type(const struct svm_model *model);
 int svm_get_nr_class(const struct svm_model *model);
@@ -87,16 +131,26 @@ double svm_get_svr_probability(const struct svm_model *model);
 
 double svm_predict_values(const struct svm_model *model, const struct svm_node *x, double* dec_values);
 double svm_predict(const struct svm_model *model, const struct svm_node *x);
+double svm_predict_values_dag(const struct svm_model *model, const struct svm_node *x, double* dec_values);
 double svm_predict_probability(const struct svm_model *model, const struct svm_node *x, double* prob_estimates);
+void svm_predict_batch(const struct svm_model *model, const struct svm_problem *prob, int predict_probability, double *target, double *values);
+void svm_predict_batch_dag(const struct svm_model *model, const struct svm_problem *prob, double *target, double *values);
+
+int svm_build_inverted_index(struct svm_model *model);
 
 void svm_free_model_content(struct svm_model *model_ptr);
 void svm_free_and_destroy_model(struct svm_model **model_ptr_ptr);
 void svm_destroy_param(struct svm_parameter *param);
 
 const char *svm_check_parameter(const struct svm_problem *prob, const struct svm_parameter *param);
+const char *svm_check_parameter_incremental(const struct svm_problem *old_prob, const struct svm_problem *new_prob, const struct svm_parameter *param);
 int svm_check_probability_model(const struct svm_model *model);
 
 void svm_set_print_string_function(void (*print_func)(const char *));
+int svm_set_num_threads(int nr_thread);
+void svm_set_random_seed(unsigned int seed);
+
+int svm_parse_problem(const char *buf, size_t len, double *y, size_t *rowptr, int *index, double *value, int *l, size_t *nnz);
 
 #ifdef __cplusplus
 }
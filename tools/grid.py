@@ -35,6 +35,8 @@ class GridOption:
         self.png_pathname = '{0}.png'.format(self.dataset_title)
         self.pass_through_string = ' '
         self.resume_pathname = None
+        self.nr_inprocess_worker = 0
+        self.is_kernel = False
         self.parse_options(options)
 
     def parse_options(self, options):
@@ -85,12 +87,23 @@ class GridOption:
                 else:
                     i = i + 1
                     self.resume_pathname = options[i]
+            elif options[i] == '-inprocess':
+                i = i + 1
+                self.nr_inprocess_worker = int(options[i])
+                if self.nr_inprocess_worker <= 0:
+                    raise ValueError('-inprocess needs a positive number of workers')
             else:
+                if options[i] == '-t' and i+1 < len(options):
+                    self.is_kernel = options[i+1] == '4'
+                if options[i] == '-m' and i+1 < len(options):
+                    parse_auto_cache(options[i+1])
                 pass_through_options.append(options[i])
             i = i + 1
 
         self.pass_through_string = ' '.join(pass_through_options)
-        if not os.path.exists(self.svmtrain_pathname):
+        # for svm-train run on this machine; see split_cache_option
+        self.local_pass_through_string = self.pass_through_string
+        if not self.nr_inprocess_worker and not os.path.exists(self.svmtrain_pathname):
             raise IOError('svm-train executable not found')
         if not os.path.exists(self.dataset_pathname):
             raise IOError('dataset not found')
@@ -156,6 +169,56 @@ def redraw(db,best_param,gnuplot,options,tofile=False):
     gnuplot.flush()
 
 
+def available_memory():
+    # available physical memory in MB, 0 if unknown (as in LIBSVM)
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return float(line.split()[1])/1024
+    except (IOError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES')*os.sysconf('SC_PAGE_SIZE')/float(1<<20)
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+def parse_auto_cache(value):
+    # max_MB of -m auto[:max_MB] (0 for auto), or None for a number of MB;
+    # checked as strictly as by svm-train
+    if not value.startswith('auto'):
+        return None
+    if value == 'auto':
+        return 0
+    try:
+        if not value.startswith('auto:'):
+            raise ValueError
+        max_size = float(value[5:])
+    except ValueError:
+        max_size = 0
+    if not max_size > 0:
+        raise ValueError('Wrong cache size {0}'.format(value))
+    return max_size
+
+def split_cache_option(pass_through_string, nr_worker):
+    # -m auto[:max_MB] sizes the caches of a training from the memory
+    # available when it starts, so concurrent local trainings would all
+    # claim the same memory. Each gets auto:budget/nr_worker instead.
+    # Only local command lines are rewritten; remote hosts have their own
+    # memory.
+    argv = pass_through_string.split()
+    for i in range(len(argv)-1):
+        if argv[i] != '-m' or not argv[i+1].startswith('auto') or nr_worker <= 1:
+            continue
+        budget = available_memory()/2
+        max_size = parse_auto_cache(argv[i+1])
+        if max_size > 0:
+            if budget <= 0 or budget > max_size:
+                budget = max_size
+        if budget > 0:
+            argv[i+1] = 'auto:{0:g}'.format(budget/nr_worker)
+    return ' '.join(argv)
+
 def calculate_jobs(options):
 
     def range_f(begin,end,step):
@@ -248,6 +311,7 @@ class Worker(Thread):
         self.job_queue = job_queue
         self.result_queue = result_queue
         self.options = options
+        self.pass_through_string = options.pass_through_string
 
     def run(self):
         while True:
@@ -283,10 +347,23 @@ class Worker(Thread):
         if options.grid_with_g:
             cmdline += ' -g {0} '.format(g)
         cmdline += ' -v {0} {1} {2} '.format\
-            (options.fold,options.pass_through_string,'"' + options.dataset_pathname + '"')
+            (options.fold,self.pass_through_string,'"' + options.dataset_pathname + '"')
         return cmdline
 
+    def get_svm_options(self,c,g):
+        options=self.options
+        svm_options = '-q'
+        if options.grid_with_c:
+            svm_options += ' -c {0}'.format(c)
+        if options.grid_with_g:
+            svm_options += ' -g {0}'.format(g)
+        svm_options += ' -v {0} {1}'.format(options.fold,self.pass_through_string)
+        return svm_options
+
 class LocalWorker(Worker):
+    def __init__(self,name,job_queue,result_queue,options):
+        Worker.__init__(self,name,job_queue,result_queue,options)
+        self.pass_through_string = options.local_pass_through_string
     def run_one(self,c,g):
         cmdline = self.get_cmd(c,g)
         result = Popen(cmdline,shell=True,stdout=PIPE,stderr=PIPE,stdin=PIPE).stdout
@@ -336,7 +413,102 @@ class TelnetWorker(Worker):
             if str(line).find('Cross') != -1:
                 return float(line.split()[-1][0:-1])
 
-def find_parameters(dataset_pathname, options=''):
+# The in-process mode reads the dataset once, copies the svm_node array,
+# labels and row pointers into a shared memory block, and lets each worker
+# process build an svm_problem on top of it. No svm-train is launched and
+# the CV rate is the value returned by svm_train. Each process keeps the
+# kernel cache of its last gamma, so jobs are queued grouped by gamma.
+
+def import_libsvm():
+    try:
+        import libsvm.svmutil
+    except ImportError:
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+        import libsvm.svmutil
+    return libsvm.svmutil
+
+class SharedProblem:
+    def __init__(self, options):
+        from multiprocessing import shared_memory
+        svmutil = import_libsvm()
+        if svmutil.scipy is None:
+            raise ImportError('-inprocess requires NumPy and SciPy')
+        np = svmutil.np
+        y, x = svmutil.svm_read_problem(options.dataset_pathname, return_scipy=True)
+        prob = svmutil.svm_problem(y, x, isKernel=options.is_kernel)
+        self.l, self.n, self.nr_node = prob.l, prob.n, len(prob.x_space)
+        # x_space first so that the 16-byte svm_node array is aligned
+        size = prob.x_space.nbytes + 8*(2*self.l+1)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size,1))
+        x_space, y, rowptr = self.get_arrays(self.shm, self.l, self.nr_node)
+        x_space[:] = prob.x_space
+        if self.l > 0:
+            y[:] = np.ctypeslib.as_array(prob.y, (self.l,))
+        rowptr[:] = prob.rowptr
+
+    @staticmethod
+    def get_arrays(shm, l, nr_node):
+        svmutil = import_libsvm()
+        np = svmutil.np
+        x_space = np.ndarray((nr_node,), dtype=svmutil.svm_node, buffer=shm.buf)
+        offset = x_space.nbytes
+        y = np.ndarray((l,), dtype=np.float64, buffer=shm.buf, offset=offset)
+        rowptr = np.ndarray((l+1,), dtype=np.int64, buffer=shm.buf, offset=offset+8*l)
+        return x_space, y, rowptr
+
+    def initargs(self):
+        return (self.shm.name, self.l, self.n, self.nr_node)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+inprocess_problem = None
+inprocess_kernel_cache = None
+
+def attach_problem(shm_name, l, n, nr_node):
+    # runs in each pool process; the problem stays attached until it exits
+    global inprocess_problem
+    from multiprocessing import shared_memory
+    from ctypes import c_double
+    svmutil = import_libsvm()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    x_space, y, rowptr = SharedProblem.get_arrays(shm, l, nr_node)
+    prob = svmutil.svm_problem.__new__(svmutil.svm_problem)
+    prob.l, prob.n = l, n
+    prob.y = (c_double * l)()
+    if l > 0:
+        svmutil.np.ctypeslib.as_array(prob.y, (l,))[:] = y
+    prob.set_x_space(x_space, rowptr)
+    prob.shm = shm
+    inprocess_problem = prob
+
+def cross_validation_rate(svm_options):
+    global inprocess_kernel_cache
+    from contextlib import redirect_stdout
+    svmutil = import_libsvm()
+    param = svmutil.svm_parameter(svm_options)
+    key = (param.kernel_type, param.degree, param.gamma, param.coef0)
+    if inprocess_kernel_cache is None or inprocess_kernel_cache[0] != key:
+        inprocess_kernel_cache = None
+        inprocess_kernel_cache = (key, svmutil.svm_kernel_cache(inprocess_problem, param))
+    # the folds of svm-train, which starts from seed 1 in a new process
+    svmutil.libsvm.svm_set_random_seed(1)
+    # svm_train prints the CV result even with -q
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        rate = svmutil.svm_train(inprocess_problem, param, kernel_cache=inprocess_kernel_cache[1])
+    # rounded as in the output of svm-train
+    return float('{0:g}'.format(rate))
+
+class InProcessWorker(Worker):
+    def __init__(self,name,job_queue,result_queue,options,pool):
+        Worker.__init__(self,name,job_queue,result_queue,options)
+        self.pass_through_string = options.local_pass_through_string
+        self.pool = pool
+    def run_one(self,c,g):
+        return self.pool.submit(cross_validation_rate, self.get_svm_options(c,g)).result()
+
+def find_parameters(dataset_pathname, options='', return_results=False):
 
     def update_param(c,g,rate,best_c,best_g,best_rate,worker,resumed):
         if (rate > best_rate) or (rate==best_rate and g==best_g and c<best_c):
@@ -360,6 +532,17 @@ def find_parameters(dataset_pathname, options=''):
         return best_c,best_g,best_rate
 
     options = GridOption(dataset_pathname, options);
+    options.local_pass_through_string = split_cache_option(options.pass_through_string,
+        options.nr_inprocess_worker or nr_local_worker)
+
+    shared_problem, pools = None, []
+    if options.nr_inprocess_worker:
+        from concurrent.futures import ProcessPoolExecutor
+        shared_problem = SharedProblem(options)
+        # one process per worker so that its kernel cache follows its jobs
+        for i in range(options.nr_inprocess_worker):
+            pools.append(ProcessPoolExecutor(1, initializer=attach_problem,
+                                             initargs=shared_problem.initargs()))
 
     if options.gnuplot_pathname:
         gnuplot = Popen(options.gnuplot_pathname,stdin = PIPE,stdout=PIPE,stderr=PIPE).stdin
@@ -375,10 +558,17 @@ def find_parameters(dataset_pathname, options=''):
     for (c,g) in resumed_jobs:
         result_queue.put(('resumed',c,g,resumed_jobs[(c,g)]))
 
+    # keep the coarse-to-fine order; in-process workers get the jobs of
+    # each step grouped by gamma for their kernel caches
+    g_order = {}
     for line in jobs:
+        line = [(c,g) for (c,g) in line if (c,g) not in resumed_jobs]
+        if pools:
+            for (c,g) in line:
+                g_order.setdefault(g, len(g_order))
+            line.sort(key = lambda job: g_order[job[1]])
         for (c,g) in line:
-            if (c,g) not in resumed_jobs:
-                job_queue.put((c,g))
+            job_queue.put((c,g))
 
     # hack the queue to become a stack --
     # this is important when some thread
@@ -409,9 +599,14 @@ def find_parameters(dataset_pathname, options=''):
 
     # fire local workers
 
-    for i in range(nr_local_worker):
-        worker = LocalWorker('local',job_queue,result_queue,options)
-        worker.start()
+    if pools:
+        for pool in pools:
+            worker = InProcessWorker('inprocess',job_queue,result_queue,options,pool)
+            worker.start()
+    else:
+        for i in range(nr_local_worker):
+            worker = LocalWorker('local',job_queue,result_queue,options)
+            worker.start()
 
     # gather results
 
@@ -448,6 +643,10 @@ def find_parameters(dataset_pathname, options=''):
     if options.out_pathname:
         result_file.close()
     job_queue.put((WorkerStopToken,None))
+    if pools:
+        for pool in pools:
+            pool.shutdown()
+        shared_problem.close()
     best_param, best_cg  = {}, []
     if best_c != None:
         best_param['c'] = 2.0**best_c
@@ -457,6 +656,17 @@ def find_parameters(dataset_pathname, options=''):
         best_cg += [2.0**best_g]
     print('{0} {1}'.format(' '.join(map(str,best_cg)), best_rate))
 
+    if return_results:
+        results = []
+        for (c,g,rate) in db:
+            result = {'rate': rate}
+            if c != None:
+                result['c'] = 2.0**c
+            if g != None:
+                result['g'] = 2.0**g
+            results.append(result)
+        return best_rate, best_param, results
+
     return best_rate, best_param
 
 
@@ -484,6 +694,8 @@ grid_options :
 -png pathname : set graphic output file path and name (default dataset.png)
 -resume [pathname] : resume the grid task using an existing output file (default pathname is dataset.out)
     This is experimental. Try this option only if some parameters have been checked for the SAME data.
+-inprocess n : run n worker processes that call svm_train of the Python interface
+    instead of the svm-train executable; the dataset is read only once
 
 svm_options : additional options for svm-train""")
         sys.exit(1)